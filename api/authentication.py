@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Authentication by issued API tokens ("Authorization: Token <key>").
+
+Only a SHA-256 digest of every key is stored, and verified digests are remembered in an
+in-process LRU and in the default cache, so a request costs a hash and a dictionary lookup
+instead of a password hasher run. Revocation drops the cached entry at once and again on
+commit; the local entries live for TOKEN_LOCAL_TTL seconds, which bounds how long other
+processes may still accept a revoked token. That bound only holds with a cache shared by
+the workers (memcached in production): with a per-process one, the other workers keep the
+token for up to TOKEN_CACHE_TTL.
+"""
+import calendar
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import authentication, exceptions
+
+from .models import ApiToken, hash_token_key
+
+
+TOKEN_CACHE_KEY = 'hasker:api:token:{0}'
+TOKEN_CACHE_TTL = 3600
+TOKEN_LOCAL_TTL = 30
+TOKEN_LOCAL_SIZE = 1024
+
+
+class _LRUCache(object):
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                return None
+            self._entries[key] = entry
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, value)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_tokens = _LRUCache(TOKEN_LOCAL_SIZE, TOKEN_LOCAL_TTL)
+
+
+def forget_token(key_hash):
+    _local_tokens.delete(key_hash)
+    cache.delete(TOKEN_CACHE_KEY.format(key_hash))
+
+
+def _get_token(key_hash):
+    """Returns (user_id, expiration timestamp) of a valid token, or None"""
+    token = _local_tokens.get(key_hash)
+    if token is not None:
+        return token
+    token = cache.get(TOKEN_CACHE_KEY.format(key_hash))
+    if token is None:
+        try:
+            api_token = ApiToken.objects.get(key_hash=key_hash)
+        except ApiToken.DoesNotExist:
+            return None
+        if not api_token.is_valid():
+            return None
+        token = (api_token.user_id, calendar.timegm(api_token.expiration_date.utctimetuple()))
+        cache.set(TOKEN_CACHE_KEY.format(key_hash), token, min(TOKEN_CACHE_TTL, int(token[1] - time.time()) + 1))
+    _local_tokens.set(key_hash, token)
+    return token
+
+
+class TokenAuthentication(authentication.BaseAuthentication):
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header')
+        try:
+            key = auth[1].decode('ascii')
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header')
+        token = _get_token(hash_token_key(key))
+        if token is None or token[1] <= time.time():
+            raise exceptions.AuthenticationFailed('Invalid token')
+        try:
+            user = get_user_model()._default_manager.get(pk=token[0])
+        except get_user_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted')
+        return user, key
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import force_bytes
+from rest_framework.response import Response
+
+from hasker import generations
+
+
+RESPONSE_CACHE_KEY = 'hasker:api:response:{0}'
+RESPONSE_CACHE_TTL = 300
+
+
+class AnonymousCacheMixin(object):
+    """
+    Serves GET requests of anonymous users from the rendered bytes of an earlier response.
+    The key covers the path, the query string and the generations returned by
+    get_cache_generation_keys(), so writes to the question invalidate it without deletes.
+    HTML is never cached since the browsable API embeds a CSRF token.
+    """
+    cache_formats = ('json',)
+
+    def get_cache_generation_keys(self):
+        raise NotImplementedError()
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated or request.accepted_renderer.format not in self.cache_formats:
+            return super(AnonymousCacheMixin, self).get(request, *args, **kwargs)
+        key = self._get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            return self._make_response(request, *cached)
+        response = super(AnonymousCacheMixin, self).get(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            response.add_post_render_callback(lambda rendered: cache.set(key, (
+                rendered.content,
+                rendered['Content-Type'],
+                rendered.get('ETag')
+            ), RESPONSE_CACHE_TTL))
+        return response
+
+    def _get_cache_key(self, request):
+        digest = hashlib.sha1()
+        digest.update(force_bytes(request.accepted_renderer.format))
+        digest.update(force_bytes(request.path))
+        digest.update(force_bytes(repr(sorted(request.query_params.lists()))))
+        digest.update(force_bytes(repr(generations.get_generations(self.get_cache_generation_keys()))))
+        return RESPONSE_CACHE_KEY.format(digest.hexdigest())
+
+    @staticmethod
+    def _make_response(request, content, content_type, etag):
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        if etag:
+            response['ETag'] = etag
+        return response
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import filters
+
+from hasker import search
+from .serializers import get_sparse_params
+
+
+class FullTextSearchFilter(filters.BaseFilterBackend):
+    """
+    Filters questions by the ?search= parameter using the indexed full-text search.
+    Results are ordered by rank unless the request sets an explicit ?ordering=.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = search.search(queryset, query)
+        if filters.OrderingFilter.ordering_param not in request.query_params:
+            queryset = queryset.order_by('-rank', '-id')
+        return queryset
+
+
+class SparseFieldsFilter(filters.BaseFilterBackend):
+    """
+    Loads only the columns behind the serializer fields selected with ?fields= / ?omit=,
+    joins and prefetches only the selected relations. The ordering keys are always loaded.
+    Must come after the filters that order.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        fields, omit = get_sparse_params(request)
+        if fields is None and omit is None:
+            return queryset
+        meta = queryset.model._meta
+        columns = set(name.lstrip('-') for name in queryset.query.order_by or meta.ordering)
+        columns.add('pk')
+        related = []
+        prefetched = []
+        for field in view.get_serializer().fields.values():
+            attrs = field.source.split('.')
+            try:
+                model_field = meta.get_field(attrs[0])
+            except FieldDoesNotExist:
+                return queryset  # a property or a method may read any column
+            if model_field.many_to_many:
+                prefetched.append(attrs[0])
+                continue
+            if model_field.is_relation and len(attrs) > 1:
+                related.append(attrs[0])
+            columns.add('__'.join(attrs))
+        columns = [name for name in columns if name == 'pk' or '__' in name or self._is_field(meta, name)]
+        prefetched_lookups = queryset._prefetch_related_lookups
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetched:
+            # keep the view's Prefetch objects, they may order or filter the related rows
+            lookups = {getattr(lookup, 'prefetch_to', lookup): lookup for lookup in prefetched_lookups}
+            queryset = queryset.prefetch_related(*[lookups.get(name, name) for name in prefetched])
+        return queryset.only(*columns)
+
+    @staticmethod
+    def _is_field(meta, name):
+        try:
+            meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return True
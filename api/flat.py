@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Flat read path for list endpoints.
+
+Rows are fetched with .values_list() and rendered by a plan compiled once per request from the
+serializer's fields, instead of building model instances and resolving every field through
+DRF's get_attribute(). The output is identical to the serializer's as long as the regular path
+prefetches many-to-many relations ordered by their 'flat_field', the order the plan reads them in.
+Serializers with fields the plan cannot express (methods, nested serializers, related fields
+without 'flat_field') keep the regular path.
+"""
+from collections import OrderedDict, namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.query import ValuesListIterable
+from rest_framework import relations, serializers
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class FlatPlan(object):
+
+    def __init__(self, serializer, queryset, extra_columns=()):
+        self.model = queryset.model
+        self.columns = []
+        self._renderers = []
+        self._many = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, relations.ManyRelatedField):
+                self._add_many(name, field)
+            elif isinstance(field, (relations.RelatedField, serializers.BaseSerializer,
+                                    serializers.SerializerMethodField)) or field.source == '*':
+                raise _Unsupported()
+            else:
+                self._add_column(name, field)
+        for column in extra_columns:
+            if column not in self.columns:
+                self.columns.append(column)
+        self.row_class = _get_row_class(tuple(self.columns + [attr for attr, _, _ in self._many]))
+        self.iterable_class = type('FlatIterable', (_FlatIterable,), {'plan': self})
+
+    @classmethod
+    def compile(cls, serializer, queryset, extra_columns=()):
+        """Returns the plan for the serializer, or None if it has fields the flat path cannot render"""
+        try:
+            return cls(serializer, queryset, extra_columns)
+        except _Unsupported:
+            return None
+
+    def _add_column(self, name, field):
+        meta = self.model._meta
+        for i, attr in enumerate(field.source_attrs):
+            try:
+                model_field = meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise _Unsupported()
+            is_last = i == len(field.source_attrs) - 1
+            # a relation is followed, only its own column ('author_id') is a value
+            is_value = not model_field.is_relation or attr == model_field.attname
+            if model_field.many_to_many or model_field.one_to_many or is_value != is_last:
+                raise _Unsupported()
+            if not is_last:
+                meta = model_field.related_model._meta
+        column = '__'.join(field.source_attrs)
+        if column not in self.columns:
+            self.columns.append(column)
+        self._renderers.append((name, column, field.to_representation))
+
+    def _add_many(self, name, field):
+        flat_field = getattr(field.child_relation, 'flat_field', None)
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise _Unsupported()
+        if flat_field is None or not model_field.many_to_many or model_field.auto_created:
+            raise _Unsupported()
+        # read the through table directly, ordered by the rendered value
+        through = model_field.remote_field.through
+        value = '{0}__{1}'.format(model_field.m2m_reverse_field_name(), flat_field)
+        rows = through.objects.order_by(value).values_list(model_field.m2m_column_name(), value)
+        attr = field.source + '_' + flat_field
+        self._many.append((attr, model_field.m2m_column_name(), rows))
+        self._renderers.append((name, attr, None))
+
+    def apply(self, queryset):
+        queryset = queryset.prefetch_related(None).values_list(*self.columns)
+        queryset._iterable_class = self.iterable_class
+        return queryset
+
+    def make_rows(self, rows):
+        if not self._many:
+            return [self.row_class(*row) for row in rows]
+        ids = [row[self.columns.index('id')] for row in rows]
+        related = []
+        for _, column, through_rows in self._many:
+            values = {}
+            for pk, value in through_rows.filter(**{column + '__in': ids}):
+                values.setdefault(pk, []).append(value)
+            related.append(values)
+        return [self.row_class(*(row + tuple(values.get(pk, []) for values in related)))
+                for pk, row in zip(ids, rows)]
+
+    def render(self, rows):
+        renderers = [(name, self.row_class._fields.index(attr), to_representation)
+                     for name, attr, to_representation in self._renderers]
+        data = []
+        for row in rows:
+            item = OrderedDict()
+            for name, index, to_representation in renderers:
+                value = row[index]
+                if to_representation is None or value is None:
+                    item[name] = value
+                else:
+                    item[name] = to_representation(value)
+            data.append(item)
+        return data
+
+
+_row_classes = {}
+
+
+def _get_row_class(attrs):
+    # building a namedtuple class costs more than rendering a page, and the attribute
+    # sets are few (the serializer fields, narrowed by ?fields=, plus the ordering keys)
+    if attrs not in _row_classes:
+        _row_classes[attrs] = namedtuple('Row', attrs)
+    return _row_classes[attrs]
+
+
+class _FlatIterable(ValuesListIterable):
+    plan = None
+
+    def __iter__(self):
+        return iter(self.plan.make_rows(list(super(_FlatIterable, self).__iter__())))
+
+
+class FlatSerializer(object):
+    """Stands in for a many=True serializer of plan rows"""
+
+    def __init__(self, plan, rows):
+        self.plan = plan
+        self.rows = rows
+
+    @property
+    def data(self):
+        return self.plan.render(self.rows)
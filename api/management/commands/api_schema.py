@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from api.schema import SCHEMA_FORMATS, anonymous_request, generate_schema
+
+
+class Command(BaseCommand):
+    help = 'Writes the API schema of anonymous users, to be served as a static file or loaded through API_SCHEMA_FILE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write to instead of the standard output')
+        parser.add_argument('--format', choices=SCHEMA_FORMATS, default='openapi')
+
+    def handle(self, *args, **options):
+        content = generate_schema(options['format'], anonymous_request())
+        if options['output'] is None:
+            self.stdout.write(content, ending='')
+        else:
+            with open(options['output'], 'wb') as file_:
+                file_.write(content)
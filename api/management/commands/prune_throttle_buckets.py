@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from api.throttling import get_store
+
+
+class Command(BaseCommand):
+    help = 'Deletes the throttle buckets left idle long enough to be full again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-idle', type=int, default=86400,
+                            help='Seconds without requests, at least the longest throttle duration')
+
+    def handle(self, *args, **options):
+        pruned = get_store().prune(options['max_idle'])
+        self.stdout.write('Pruned {0:d} bucket(s)'.format(pruned))
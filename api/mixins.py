@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import force_bytes
+from django.utils.http import quote_etag
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+
+from .flat import FlatPlan, FlatSerializer
+
+
+class BatchListMixin(object):
+    """
+    Returns the objects listed in ?ids=1,2,3 with one 'id__in' query instead of a page.
+    Results keep the requested order; unknown ids and ids the other filters exclude are skipped.
+    """
+    batch_query_param = 'ids'
+    max_batch_size = 100
+
+    def list(self, request, *args, **kwargs):
+        if self.batch_query_param not in request.query_params:
+            return super(BatchListMixin, self).list(request, *args, **kwargs)
+        ids = self._get_ids(request.query_params[self.batch_query_param])
+        queryset = self.filter_queryset(self.get_queryset()).filter(id__in=ids).order_by()
+        objects = {obj.id: obj for obj in queryset}
+        serializer = self.get_serializer([objects[id_] for id_ in ids if id_ in objects], many=True)
+        return Response(OrderedDict([('results', serializer.data)]))
+
+    def _get_ids(self, value):
+        try:
+            ids = [int(id_) for id_ in value.split(',') if id_.strip()]
+        except ValueError:
+            raise ParseError('Ids must be a comma-separated list of integers')
+        ids = list(OrderedDict.fromkeys(ids))
+        if len(ids) > self.max_batch_size:
+            raise ParseError('No more than {0} ids can be requested at once'.format(self.max_batch_size))
+        return ids
+
+
+class MyVoteMixin(object):
+    """
+    Looks up the requesting user's votes on the page (or the object) being serialized with one
+    '__in' query and passes them to the serializers as the 'my_votes' context dict.
+    Anonymous requests never query. 'vote_model' refers to the voted object by 'vote_target'.
+    """
+    vote_model = None
+    vote_target = None
+
+    def initial(self, request, *args, **kwargs):
+        super(MyVoteMixin, self).initial(request, *args, **kwargs)
+        self.my_votes = {}
+        self._voted_ids = set()
+
+    def get_serializer_context(self):
+        context = super(MyVoteMixin, self).get_serializer_context()
+        context['my_votes'] = getattr(self, 'my_votes', {})  # the schema generator skips initial()
+        return context
+
+    def paginate_queryset(self, queryset):
+        page = super(MyVoteMixin, self).paginate_queryset(queryset)
+        if page is not None:
+            self.load_my_votes(page)
+        return page
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.request.method == 'GET':
+            self.load_my_votes(args[0] if kwargs.get('many') else [args[0]])
+        return super(MyVoteMixin, self).get_serializer(*args, **kwargs)
+
+    def get_etag(self, request, page):
+        etag = super(MyVoteMixin, self).get_etag(request, page)
+        if not self.my_votes:
+            return etag
+        return quote_etag(hashlib.sha1(force_bytes(etag + repr(sorted(self.my_votes.items())))).hexdigest())
+
+    def load_my_votes(self, objects):
+        user = self.request.user
+        if not user.is_authenticated:
+            return
+        ids = set(obj.id for obj in objects) - self._voted_ids
+        if not ids:
+            return
+        self._voted_ids |= ids
+        target_id = self.vote_target + '_id'
+        self.my_votes.update(self.vote_model.objects.filter(user=user, **{target_id + '__in': ids})
+                             .values_list(target_id, 'value'))
+
+
+class FlatListMixin(object):
+    """
+    Serves GET lists through the flat read path: the filtered queryset yields .values_list()
+    rows, and get_serializer(many=True) renders them with a plan compiled from the serializer.
+    Must precede the mixins that read the page rows. Set 'flat_read' on the view or API_FLAT_READ
+    to False to render through the serializer.
+    """
+    flat_plan = None
+    flat_read = True
+
+    def filter_queryset(self, queryset):
+        queryset = super(FlatListMixin, self).filter_queryset(queryset)
+        if self.request.method != 'GET' or not (self.flat_read and settings.API_FLAT_READ):
+            return queryset
+        ordering = [name.lstrip('-') for name in queryset.query.order_by or queryset.model._meta.ordering]
+        extra_columns = ['id'] + [name for name in ordering if name not in ('pk', '?')]
+        self.flat_plan = FlatPlan.compile(self.get_serializer(), queryset, extra_columns)
+        if self.flat_plan is None:
+            return queryset
+        return self.flat_plan.apply(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and self.flat_plan is not None:
+            return FlatSerializer(self.flat_plan, args[0])
+        return super(FlatListMixin, self).get_serializer(*args, **kwargs)
+
+    def get_etag_values(self, obj, etag_fields):
+        if self.flat_plan is not None:
+            return tuple(obj)
+        return super(FlatListMixin, self).get_etag_values(obj, etag_fields)
+
+
+class ConditionalListMixin(object):
+    """
+    Sets a strong ETag on a paginated list response. It is computed from the rows of the page,
+    so a matching If-None-Match gets a 304 before anything is serialized. 'etag_fields' must cover
+    every attribute the serializer renders; the ones whose serializer fields the request leaves
+    out are not read. There is no Last-Modified: votes and edits change a page without changing
+    any date on it.
+    """
+    etag_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        etag = self.get_etag(request, page)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        response['ETag'] = etag
+        return response
+
+    def get_etag(self, request, page):
+        digest = hashlib.sha1()
+        digest.update(force_bytes(request.accepted_renderer.format))
+        digest.update(force_bytes(self.paginator.get_previous_link()))
+        digest.update(force_bytes(self.paginator.get_next_link()))
+        sources = set(field.source for field in self.get_serializer().fields.values())
+        etag_fields = [field for field in self.etag_fields if field in sources]
+        for obj in page:
+            digest.update(force_bytes(repr(self.get_etag_values(obj, etag_fields))))
+        return quote_etag(digest.hexdigest())
+
+    def get_etag_values(self, obj, etag_fields):
+        return [self._get_value(obj, field) for field in etag_fields]
+
+    @staticmethod
+    def _get_value(obj, field):
+        for attr in field.split('.'):
+            obj = getattr(obj, attr)
+        if hasattr(obj, 'all'):
+            return sorted(related.pk for related in obj.all())
+        return obj
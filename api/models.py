@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+
+def hash_token_key(key):
+    # the keys are long random strings, so a fast digest is as safe as a password hasher here
+    return hashlib.sha256(key.encode('ascii')).hexdigest()
+
+
+class ApiTokenManager(models.Manager):
+
+    def issue(self, user, name='', ttl=None):
+        """Creates a token for the user and returns it with its key, which is not stored anywhere"""
+        if ttl is None:
+            ttl = datetime.timedelta(days=settings.API_TOKEN_TTL_DAYS)
+        key = get_random_string(ApiToken.KEY_LENGTH)
+        token = self.create(user=user, name=name, key_hash=hash_token_key(key),
+                            expiration_date=timezone.now() + ttl)
+        return token, key
+
+
+class ApiToken(models.Model):
+    KEY_LENGTH = 40
+
+    objects = ApiTokenManager()
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    name = models.CharField(max_length=100, blank=True)
+    key_hash = models.CharField(max_length=64, unique=True)
+    creation_date = models.DateTimeField(default=timezone.now)
+    expiration_date = models.DateTimeField()
+    is_revoked = models.BooleanField(default=False)
+
+    def is_valid(self):
+        return not self.is_revoked and self.expiration_date > timezone.now()
+
+    def revoke(self):
+        from .authentication import forget_token
+        self.is_revoked = True
+        self.save(update_fields=['is_revoked'])
+        forget_token(self.key_hash)
+        # a request between the delete above and the commit could cache the token as still valid
+        transaction.on_commit(lambda: forget_token(self.key_hash))
+
+
+class ThrottleBucket(models.Model):
+    """Token bucket of a throttle key, see api.throttling.DatabaseBucketStore"""
+    key = models.CharField(max_length=255, unique=True)
+    tokens = models.FloatField()
+    updated = models.FloatField()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+from django.utils.encoding import force_text
+from rest_framework import pagination
+from rest_framework.compat import coreapi, coreschema
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from hasker.pagination import KeysetPaginator, InvalidCursor
+
+
+class KeysetCursorPagination(pagination.BasePagination):
+    """
+    Cursor pagination over the queryset ordering with 'id' as the final tie-breaker.
+    Unlike rest_framework.pagination.CursorPagination it seeks on every ordering key,
+    so ties on the first key never turn into OFFSET scans.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    cursor_query_description = 'The pagination cursor value.'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keys, descending = self._get_keys(queryset)
+        self.base_url = request.build_absolute_uri()
+        paginator = KeysetPaginator(queryset, keys, self.page_size, descending)
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        return self._get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._get_link(self.page.previous_cursor)
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        assert coreschema is not None, 'coreschema must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    title='Cursor',
+                    description=force_text(self.cursor_query_description)
+                )
+            )
+        ]
+
+    def _get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def _get_keys(queryset):
+        query = queryset.query
+        ordering = list(query.order_by or (query.default_ordering and queryset.model._meta.ordering) or ['-id'])
+        descending = ordering[0].startswith('-')
+        if any(field.startswith('-') != descending for field in ordering):
+            raise ParseError('Orderings with mixed directions are not supported')
+        keys = ['id' if field.lstrip('-') == 'pk' else field.lstrip('-') for field in ordering]
+        if 'id' not in keys:
+            keys.append('id')
+        return keys, descending
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from rest_framework import renderers
+
+
+class NDJSONRenderer(renderers.JSONRenderer):
+    """Newline-delimited JSON; only error responses are rendered here, exports stream their own lines"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super(NDJSONRenderer, self).render(data, accepted_media_type, renderer_context) + b'\n'
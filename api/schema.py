@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+The API schema, generated once per process and profile instead of introspecting every view on each request.
+
+The schema only lists the endpoints the requesting user is permitted to use. The permission classes
+of the API only tell anonymous users, users and staff apart, so one document per profile serves
+everybody. The anonymous one can be written to disk by the api_schema command at deploy; with
+API_SCHEMA_FILE set to such a file, the OpenAPI document of anonymous users is read from it.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.http import HttpRequest
+from rest_framework.renderers import CoreJSONRenderer
+from rest_framework.request import Request
+from rest_framework.schemas import SchemaGenerator
+from rest_framework_swagger.renderers import OpenAPICodec, OpenAPIRenderer
+
+
+SCHEMA_TITLE = 'Hasker API'
+SCHEMA_FORMATS = ('openapi', 'corejson')
+
+_documents = {}
+_lock = threading.Lock()
+
+
+class SchemaDocument(object):
+
+    def __init__(self, content, content_type):
+        self.content = content
+        self.content_type = content_type
+        self.etag = '"{0}"'.format(hashlib.sha1(content).hexdigest())
+
+
+def get_profile(user):
+    if not user.is_authenticated:
+        return 'anonymous'
+    return 'staff' if user.is_staff else 'user'
+
+
+def anonymous_request():
+    """Returns a request without credentials, to generate the schema of anonymous users with"""
+    return Request(HttpRequest())
+
+
+def generate_schema(format_, request):
+    """Returns the rendered schema in the format with the endpoints the user of the request may use"""
+    # a fixed root URL, so the document does not depend on the host the request came to
+    document = SchemaGenerator(title=SCHEMA_TITLE, url='/').get_schema(request)
+    if format_ == 'openapi':
+        return OpenAPICodec().encode(document, extra=OpenAPIRenderer().get_customizations())
+    return CoreJSONRenderer().render(document, renderer_context={})
+
+
+def get_schema(format_, request):
+    """Returns the SchemaDocument of the format for the user of the request, rendering it on the first call"""
+    key = (format_, get_profile(request.user))
+    document = _documents.get(key)
+    if document is None:
+        with _lock:
+            document = _documents.get(key)
+            if document is None:
+                document = _documents[key] = SchemaDocument(_load(format_, request), _CONTENT_TYPES[format_])
+    return document
+
+
+def _load(format_, request):
+    if format_ == 'openapi' and settings.API_SCHEMA_FILE and not request.user.is_authenticated:
+        with open(settings.API_SCHEMA_FILE, 'rb') as file_:
+            return file_.read()
+    return generate_schema(format_, request)
+
+
+def clear_schema():
+    with _lock:
+        _documents.clear()
+
+
+_CONTENT_TYPES = {
+    'openapi': OpenAPIRenderer.media_type,
+    'corejson': CoreJSONRenderer.media_type
+}
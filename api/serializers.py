@@ -1,11 +1,75 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
 from rest_framework.serializers import ValidationError
 from hasker.models import Question, Tag, Answer
+from .models import ApiToken
 
 
-class QuestionSerializer(serializers.Serializer):
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def get_sparse_params(request):
+    """Returns the field names of ?fields= and ?omit=, or None for a parameter the request lacks"""
+    if request is None or request.method != 'GET':
+        return None, None
+    return [_split_names(request.query_params.get(param)) for param in (FIELDS_PARAM, OMIT_PARAM)]
+
+
+def _split_names(value):
+    if value is None:
+        return None
+    return set(name.strip() for name in value.split(',') if name.strip())
+
+
+class SparseFieldsMixin(object):
+    """Drops the fields the request leaves out of ?fields= or lists in ?omit="""
+
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        fields, omit = get_sparse_params(self.context.get('request'))
+        if fields is None and omit is None:
+            return
+        unknown = ((fields or set()) | (omit or set())) - set(self.fields)
+        if unknown:
+            raise ParseError('Unknown fields: {0}'.format(', '.join(sorted(unknown))))
+        for name in list(self.fields):
+            if (fields is not None and name not in fields) or (omit is not None and name in omit):
+                self.fields.pop(name)
+
+
+class MyVoteField(serializers.ReadOnlyField):
+    """
+    The value of the requesting user's vote, or None. The votes are looked up for a whole page
+    by the view and passed in the 'my_votes' context dict keyed by the object id.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'id'
+        super(MyVoteField, self).__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.context.get('my_votes', {}).get(value)
+
+
+class AuthenticatedFieldsMixin(object):
+    """Drops the 'authenticated_fields' for anonymous requests"""
+    authenticated_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super(AuthenticatedFieldsMixin, self).__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            for name in self.authenticated_fields:
+                self.fields.pop(name, None)
+
+
+class QuestionSerializer(AuthenticatedFieldsMixin, SparseFieldsMixin, serializers.Serializer):
+    authenticated_fields = ('my_vote',)
 
     class TagField(serializers.RelatedField):
+        flat_field = 'name'  # to_representation() of a tag is its name, see api.flat
+
         def to_representation(self, value):
             return value.name
 
@@ -21,6 +85,8 @@ class QuestionSerializer(serializers.Serializer):
     tags = TagField(many=True, queryset=Tag.objects.all())
     rating = serializers.IntegerField(read_only=True)
     creation_date = serializers.DateTimeField(read_only=True)
+    accepted_answer = serializers.IntegerField(source='accepted_answer_id', read_only=True)
+    my_vote = MyVoteField()
 
     def validate_tags(self, tags):
         if len(tags) > 3:
@@ -37,12 +103,33 @@ class QuestionSerializer(serializers.Serializer):
         return instance
 
 
-class AnswerSerializer(serializers.ModelSerializer):
+class AnswerSerializer(AuthenticatedFieldsMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    authenticated_fields = ('my_vote',)
 
     author = serializers.ReadOnlyField(source='author.username')
     rating = serializers.IntegerField(read_only=True)
     creation_date = serializers.DateTimeField(read_only=True)
+    my_vote = MyVoteField()
 
     class Meta:
         model = Answer
-        fields = ('id', 'text', 'author', 'rating', 'creation_date')
+        fields = ('id', 'text', 'author', 'rating', 'creation_date', 'my_vote')
+
+
+class ApiTokenSerializer(serializers.ModelSerializer):
+    """The key is returned once, in the response that issues the token"""
+
+    key = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ApiToken
+        fields = ('id', 'name', 'key', 'creation_date', 'expiration_date')
+        read_only_fields = ('creation_date', 'expiration_date')
+
+    def get_key(self, token):
+        return getattr(token, 'key', None)
+
+    def create(self, validated_data):
+        token, key = ApiToken.objects.issue(validated_data['user'], validated_data.get('name', ''))
+        token.key = key
+        return token
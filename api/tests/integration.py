@@ -1,17 +1,57 @@
 import base64
+import datetime
+import gzip
 import json
+import logging
+import os
+import shutil
+import tempfile
+import time
 from io import BytesIO
 
+import mock
 from PIL import Image
 
 from django.urls import reverse
-from django.test import TestCase
+from django.db import connection
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils.http import http_date
+from django.utils.six import StringIO
+
+from rest_framework import serializers
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api import authentication, schema
+from api.authentication import TokenAuthentication
+from api.flat import FlatPlan, FlatSerializer
+from api.models import ApiToken, ThrottleBucket
+from api.throttling import DatabaseBucketStore, LocalBucketStore, get_store
+from api.views import ORDERED_TAGS
+from api.serializers import QuestionSerializer, AnswerSerializer
+from hasker.models import Question, Answer, Tag
+
+
+logger = logging.getLogger(__name__)
+
+
+def _reset():
+    # the response cache and the local throttle buckets outlive the test transactions
+    cache.clear()
+    get_store().clear()
 
 
 class TestQuestions(TestCase):
 
     def setUp(self):
+        _reset()
         password = 'g78t87gt89g'
         data = {'username': 'bob',
                 'email': 'bob@mail.ru',
@@ -48,10 +88,27 @@ class TestQuestions(TestCase):
         resp = self.client.get(reverse('api:questions')+'?ordering=-rating,-creation_date')
         self.assertEqual(resp.status_code, 200)
 
+        # search the questions
+        resp = self.client.get(reverse('api:questions')+'?search=question')
+        self.assertEqual([question['id'] for question in resp.json()['results']], [pk])
+        resp = self.client.get(reverse('api:questions')+'?search=answer')
+        self.assertEqual(resp.json()['results'], [])
+
+        # the number of queries does not depend on the number of tags
+        counts = []
+        for tags in (['golang'], ['rust', 'ruby', 'perl']):
+            data = json.dumps({'title': 'My Question', 'text': 'My Text', 'tags': tags})
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.post(reverse('api:questions'), data, content_type='application/json')
+            self.assertEqual(resp.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
 
 class TestAnswers(TestCase):
 
     def setUp(self):
+        _reset()
         password = 'g78t87gt89g'
         data = {'username': 'bob',
                 'email': 'bob@mail.ru',
@@ -99,8 +156,40 @@ class TestAnswers(TestCase):
         self.assertEqual(resp.status_code, 200)
 
 
+class TestAcceptedAnswer(TestCase):
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.user = User.objects.create(username='bob', email='bob@mail.ru', avatar='blank.png')
+        self.question = Question.objects.create('My Question', 'My Text', self.user, [])
+        self.answers = [self.question.answer_set.create(author=self.user, text='Answer {0}'.format(i))
+                        for i in xrange(12)]
+
+    def test_pinned(self):
+        url = reverse('api:answers', kwargs={'question_pk': self.question.pk})
+        accepted = self.answers[0]
+        accepted.mark_correct(self.user)
+        first = self.client.get(url).json()
+        self.assertEqual(first['results'][0]['id'], accepted.pk)
+        self.assertEqual(len(first['results']), 11)
+        second = self.client.get(first['next']).json()
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(sorted(ids), sorted(answer.pk for answer in self.answers))
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual(previous['results'], first['results'])
+
+        data = self.client.get(reverse('api:questions')).json()
+        self.assertEqual(data['results'][0]['accepted_answer'], accepted.pk)
+        data = self.client.get(reverse('api:question', kwargs={'pk': self.question.pk})).json()
+        self.assertEqual(data['accepted_answer'], accepted.pk)
+
+
 class TestBasicAuth(TestCase):
 
+    def setUp(self):
+        _reset()
+
     def test_basic_auth(self):
         self.password = 'g78t87gt89g'
         self.username = 'bob'
@@ -132,3 +221,694 @@ class TestBasicAuth(TestCase):
         Image.new('RGB', (250, 250)).save(file_, 'png')
         file_.seek(0)
         return SimpleUploadedFile('name.png', file_.read())
+
+
+class TestQueryBudgets(TestCase):
+    """The number of queries per request must not grow with the page size"""
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(10)]
+        self.question = Question.objects.create('My Question', 'My Text', self.users[0], ['python', 'c++'])
+        self.question.answer_set.create(author=self.users[0], text='My Text')
+
+    def _fill(self, num):
+        for user in self.users[:num]:
+            Question.objects.create('My Question', 'My Text', user, ['python', 'java'])
+            self.question.answer_set.create(author=user, text='My Text')
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(queries), resp.json()
+
+    def _assert_budget(self, url, budget, items):
+        self._fill(1)
+        small, data = self._count_queries(url)
+        self.assertEqual(len(items(data)), 2)
+        self._fill(9)
+        large, data = self._count_queries(url)
+        self.assertEqual(len(items(data)), 10)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, budget)
+
+    def test_question_list(self):
+        self._assert_budget(reverse('api:questions'), 2, lambda data: data['results'])
+
+    def test_answer_list(self):
+        url = reverse('api:answers', kwargs={'question_pk': self.question.pk})
+        # the first page also looks up the accepted answer to put it on top
+        self._assert_budget(url, 2, lambda data: data['results'])
+
+    def test_question_detail(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse('api:question', kwargs={'pk': self.question.pk}))
+
+    def test_answer_detail(self):
+        answer = self.question.answer_set.create(author=self.users[1], text='My Text')
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api:answer', kwargs={'question_pk': self.question.pk, 'pk': answer.pk}))
+
+
+class TestListPagination(TestCase):
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(2)]
+        self.questions = [Question.objects.create('My Question', 'My Text', self.users[0], ['python'])
+                          for _ in xrange(25)]
+        for question in self.questions[::3]:
+            question.vote(self.users[1], 1)
+
+    def _walk(self, url):
+        ids = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            ids.extend(item['id'] for item in resp.json()['results'])
+            url = resp.json()['next']
+        return ids
+
+    def test_cursor_walk(self):
+        ids = self._walk(reverse('api:questions'))
+        self.assertEqual(ids, [question.pk for question in reversed(self.questions)])
+
+        expected = Question.objects.order_by('-rating', '-creation_date', '-id').values_list('id', flat=True)
+        ids = self._walk(reverse('api:questions') + '?ordering=-rating,-creation_date')
+        self.assertEqual(ids, list(expected))
+
+    def test_previous(self):
+        first = self.client.get(reverse('api:questions')).json()
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(first['previous'])
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+    def test_answers(self):
+        question = self.questions[0]
+        answers = [question.answer_set.create(author=self.users[1], text='My Text') for _ in xrange(15)]
+        answers[5].vote(self.users[0], 1)
+        ids = self._walk(reverse('api:answers', kwargs={'question_pk': question.pk}))
+        self.assertEqual(ids, [answers[5].pk] + [answer.pk for answer in reversed(answers) if answer != answers[5]])
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('api:questions') + '?cursor=abc')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_mixed_ordering(self):
+        resp = self.client.get(reverse('api:questions') + '?ordering=-rating,creation_date')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_not_modified(self):
+        url = reverse('api:questions')
+        resp = self.client.get(url)
+        etag = resp['ETag']
+        self.assertFalse(resp.has_header('Last-Modified'))
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+
+        # a vote changes the page, so the old ETag no longer matches
+        self.questions[-1].vote(self.users[1], 1)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_if_modified_since(self):
+        # a vote changes the ratings on the page but none of its dates
+        url = reverse('api:answers', kwargs={'question_pk': self.questions[0].pk})
+        answer = self.questions[0].answer_set.create(author=self.users[1], text='My Text')
+        since = http_date()
+        answer.vote(self.users[0], 1)
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.content.decode('utf-8'))['results'][0]['rating'], 1)
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(2)]
+        self.question = Question.objects.create('My Question', 'My Text', self.users[0], ['python'])
+        self.answer = self.question.answer_set.create(author=self.users[1], text='My Text')
+
+    def _get(self, url, queries=None):
+        if queries is None:
+            return self.client.get(url).json()
+        with self.assertNumQueries(queries):
+            return self.client.get(url).json()
+
+    def test_question(self):
+        url = reverse('api:question', kwargs={'pk': self.question.pk})
+        self._get(url)
+        self.assertEqual(self._get(url, queries=0)['rating'], 0)
+        self.question.vote(self.users[1], 1)
+        self.assertEqual(self._get(url)['rating'], 1)
+
+    def test_questions(self):
+        url = reverse('api:questions')
+        self._get(url)
+        self._get(url, queries=0)
+        self.assertNotEqual(self._get(url + '?ordering=-rating', queries=2), [])
+
+        # new answers change the answer counts the question list pages show
+        self.question.answer_set.create(author=self.users[1], text='Another Text')
+        self._get(url, queries=2)
+        self.answer.vote(self.users[0], 1)
+        self._get(url, queries=0)
+
+        Question.objects.create('Another Question', 'My Text', self.users[1], ['java'])
+        self.assertEqual(len(self._get(url)['results']), 2)
+
+    def test_answers(self):
+        url = reverse('api:answers', kwargs={'question_pk': self.question.pk})
+        detail_url = reverse('api:answer', kwargs={'question_pk': self.question.pk, 'pk': self.answer.pk})
+        self._get(url)
+        self._get(detail_url)
+        self._get(url, queries=0)
+        self._get(detail_url, queries=0)
+
+        self.answer.vote(self.users[0], 1)
+        self.assertEqual(self._get(url)['results'][0]['rating'], 1)
+        self.assertEqual(self._get(detail_url)['rating'], 1)
+
+        self.question.answer_set.create(author=self.users[1], text='Another Text')
+        self.assertEqual(len(self._get(url)['results']), 2)
+
+    def test_mark_correct(self):
+        url = reverse('api:answers', kwargs={'question_pk': self.question.pk})
+        self._get(url)
+        self.answer.mark_correct(self.users[0])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertGreater(len(queries), 0)
+
+    def test_conditional(self):
+        url = reverse('api:questions')
+        etag = self.client.get(url)['ETag']
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+
+    def test_authenticated(self):
+        self.client.force_login(self.users[1])
+        url = reverse('api:question', kwargs={'pk': self.question.pk})
+        self._get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertGreater(len(queries), 0)
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(2)]
+        self.questions = [Question.objects.create('My Question', 'My Text', self.users[0], ['python', 'java'])
+                          for _ in xrange(3)]
+        self.answers = [self.questions[0].answer_set.create(author=self.users[1], text='My Text')
+                        for _ in xrange(3)]
+
+    def test_questions(self):
+        ids = [self.questions[2].pk, self.questions[0].pk, 10 ** 6, self.questions[1].pk]
+        url = reverse('api:questions') + '?ids=' + ','.join(str(id_) for id_ in ids)
+        with self.assertNumQueries(2):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()['results']
+        self.assertEqual([item['id'] for item in results], [ids[0], ids[1], ids[3]])
+        self.assertEqual(sorted(results[0]['tags']), ['java', 'python'])
+
+    def test_answers(self):
+        ids = [self.answers[1].pk, self.answers[0].pk]
+        url = reverse('api:answers', kwargs={'question_pk': self.questions[0].pk})
+        resp = self.client.get(url + '?ids={0},{1}'.format(*ids))
+        self.assertEqual([item['id'] for item in resp.json()['results']], ids)
+
+        # answers of other questions are not returned
+        url = reverse('api:answers', kwargs={'question_pk': self.questions[1].pk})
+        resp = self.client.get(url + '?ids={0},{1}'.format(*ids))
+        self.assertEqual(resp.json()['results'], [])
+
+    def test_invalid(self):
+        url = reverse('api:questions')
+        self.assertEqual(self.client.get(url + '?ids=1,a').status_code, 400)
+        ids = ','.join(str(id_) for id_ in xrange(1, 102))
+        self.assertEqual(self.client.get(url + '?ids=' + ids).status_code, 400)
+
+
+class TestSparseFields(TestCase):
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(2)]
+        self.question = Question.objects.create('My Question', 'My Text', self.users[0], ['python'])
+        self.answer = self.question.answer_set.create(author=self.users[1], text='My Text')
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json(), [query['sql'] for query in queries]
+
+    def test_questions(self):
+        data, queries = self._get(reverse('api:questions') + '?fields=id,title,rating')
+        self.assertEqual(data['results'], [{'id': self.question.pk, 'title': 'My Question', 'rating': 0}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"text"', queries[0])
+        self.assertNotIn('JOIN', queries[0])
+
+        data, queries = self._get(reverse('api:questions') + '?omit=text,author&ordering=-rating,-creation_date')
+        self.assertEqual(set(data['results'][0]), {'id', 'title', 'tags', 'rating', 'creation_date', 'accepted_answer'})
+        self.assertEqual(data['results'][0]['tags'], ['python'])
+        self.assertNotIn('"text"', queries[0])
+
+    def test_question(self):
+        data, queries = self._get(reverse('api:question', kwargs={'pk': self.question.pk}) + '?fields=author')
+        self.assertEqual(data, {'author': 'user0'})
+        self.assertEqual(len(queries), 1)
+
+    def test_answers(self):
+        url = reverse('api:answers', kwargs={'question_pk': self.question.pk})
+        data, queries = self._get(url + '?fields=id,rating')
+        self.assertEqual(data['results'], [{'id': self.answer.pk, 'rating': 0}])
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"text"', queries[0])
+        data, _ = self._get(url + '?ids={0}&omit=text'.format(self.answer.pk))
+        self.assertEqual(set(data['results'][0]), {'id', 'author', 'rating', 'creation_date'})
+
+    def test_unknown_field(self):
+        resp = self.client.get(reverse('api:questions') + '?fields=id,votes')
+        self.assertEqual(resp.status_code, 400)
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.user = User.objects.create(username='bob', email='bob@mail.ru', password='123', avatar='blank.png')
+        self.questions = [Question.objects.create('My Question', 'My Text', self.user, ['python'])
+                          for _ in xrange(3)]
+
+    def _export(self, url, **extra):
+        resp = self.client.get(url, **extra)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        return resp, b''.join(resp.streaming_content)
+
+    def test_export(self):
+        url = reverse('api:export')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        _, content = self._export(url)
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()],
+                         [question.pk for question in self.questions])
+
+        _, content = self._export(url + '?after={0}'.format(self.questions[1].pk))
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.questions[2].pk])
+
+        resp, content = self._export(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        content = gzip.GzipFile(fileobj=BytesIO(content)).read()
+        self.assertEqual(len(content.splitlines()), 3)
+
+        _, content = self._export(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(len(content.splitlines()), 3)
+
+        self.assertEqual(self.client.get(url + '?after=x').status_code, 400)
+
+
+class TestFlatSerialization(TestCase):
+    """The flat read path must render exactly what the serializers render"""
+
+    BENCHMARK_SIZES = (10, 100, 1000)
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.users = [User.objects.create(username=u'user\u0436{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(2)]
+        self.question = Question.objects.create(u'My \u0436 Question', u'My <Text>', self.users[0],
+                                                ['python', 'c++', 'java'])
+        Question.objects.create('Untagged Question', 'My Text', self.users[1], [])
+        self.question.vote(self.users[1], -1)
+        self.question.answer_set.create(author=self.users[1], text=u'My \u0436 Answer')
+        self.question.answer_set.create(author=self.users[0], text='Another Answer').mark_correct(self.users[0])
+
+    def _fill(self, num):
+        questions = Question.objects.bulk_create(
+            Question(title='Question {0}'.format(i), slug='question-{0}'.format(i), text='Text ' * 50,
+                     author=self.users[i % 2]) for i in xrange(num))
+        questions = list(Question.objects.filter(slug__startswith='question-'))
+        tags = Tag.objects.get_or_create_all(['python', 'java', 'c'])
+        QuestionTag = Question.tags.through
+        QuestionTag.objects.bulk_create(QuestionTag(question_id=question.id, tag_id=tag.id)
+                                        for question in questions for tag in tags[:question.id % 4])
+        Answer.objects.bulk_create(Answer(question=self.question, author=self.users[i % 2], text='Text ' * 50)
+                                   for i in xrange(num))
+
+    @staticmethod
+    def _render(serializer_class, queryset):
+        # a fresh queryset every time, so both paths run their queries
+        return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+    @staticmethod
+    def _render_flat(serializer_class, queryset):
+        plan = FlatPlan.compile(serializer_class(), queryset, ['id'])
+        return JSONRenderer().render(FlatSerializer(plan, list(plan.apply(queryset))).data)
+
+    def _compare(self, serializer_class, queryset):
+        expected = self._render(serializer_class, queryset)
+        self.assertEqual(self._render_flat(serializer_class, queryset), expected)
+        return expected
+
+    def test_questions(self):
+        questions = Question.objects.select_related('author').prefetch_related(ORDERED_TAGS).order_by('-id')
+        data = json.loads(self._compare(QuestionSerializer, questions))
+        self.assertEqual(data[1]['tags'], ['c++', 'java', 'python'])
+        self.assertEqual(data[0]['tags'], [])
+
+    def test_answers(self):
+        answers = Answer.objects.select_related('author').order_by('-rating', '-creation_date', '-id')
+        self._compare(AnswerSerializer, answers)
+
+    def test_views(self):
+        for url in (reverse('api:questions'), reverse('api:answers', kwargs={'question_pk': self.question.pk})):
+            with override_settings(API_FLAT_READ=False), mock.patch('api.mixins.FlatPlan.compile') as compile_:
+                cache.clear()
+                expected = self.client.get(url).content
+                compile_.assert_not_called()
+            cache.clear()
+            self.assertEqual(self.client.get(url).content, expected)
+
+    def test_unsupported(self):
+        class Serializer(QuestionSerializer):
+            title_length = serializers.SerializerMethodField()
+
+            def get_title_length(self, question):
+                return len(question.title)
+
+        self.assertIsNone(FlatPlan.compile(Serializer(), Question.objects.all()))
+
+    def test_benchmark(self):
+        self._fill(max(self.BENCHMARK_SIZES))
+        cases = (
+            (QuestionSerializer, Question.objects.select_related('author').prefetch_related(ORDERED_TAGS).order_by('-id')),
+            (AnswerSerializer, Answer.objects.select_related('author').order_by('-rating', '-creation_date', '-id'))
+        )
+        for serializer_class, queryset in cases:
+            for size in self.BENCHMARK_SIZES:
+                rows = queryset[:size]
+                self.assertEqual(self._render_flat(serializer_class, rows), self._render(serializer_class, rows))
+                timings = []
+                for render in (self._render, self._render_flat):
+                    started = time.time()
+                    for _ in xrange(5):
+                        render(serializer_class, rows)
+                    timings.append((time.time() - started) / 5 * 1000)
+                logger.info('%s x %d: serializer %.1fms, flat %.1fms', serializer_class.__name__, size, *timings)
+
+
+class TestMyVote(TestCase):
+
+    def setUp(self):
+        _reset()
+        User = get_user_model()
+        self.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(2)]
+        self.questions = [Question.objects.create('My Question', 'My Text', self.users[0], ['python'])
+                          for _ in xrange(3)]
+        self.answers = [self.questions[0].answer_set.create(author=self.users[0], text='My Text')
+                        for _ in xrange(3)]
+        self.questions[1].vote(self.users[1], 1)
+        self.answers[2].vote(self.users[1], -1)
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        vote_queries = [query['sql'] for query in queries if 'vote"' in query['sql']]
+        return resp.json(), vote_queries
+
+    def test_anonymous(self):
+        data, vote_queries = self._get(reverse('api:questions'))
+        self.assertNotIn('my_vote', data['results'][0])
+        self.assertEqual(vote_queries, [])
+        data, vote_queries = self._get(reverse('api:question', kwargs={'pk': self.questions[1].pk}))
+        self.assertNotIn('my_vote', data)
+        self.assertEqual(vote_queries, [])
+
+    def test_questions(self):
+        self.client.force_login(self.users[1])
+        data, vote_queries = self._get(reverse('api:questions'))
+        self.assertEqual({item['id']: item['my_vote'] for item in data['results']},
+                         {self.questions[0].pk: None, self.questions[1].pk: 1, self.questions[2].pk: None})
+        self.assertEqual(len(vote_queries), 1)
+
+        data, vote_queries = self._get(reverse('api:question', kwargs={'pk': self.questions[1].pk}))
+        self.assertEqual(data['my_vote'], 1)
+        self.assertEqual(len(vote_queries), 1)
+
+        ids = '{0},{1}'.format(self.questions[1].pk, self.questions[2].pk)
+        data, vote_queries = self._get(reverse('api:questions') + '?fields=id,my_vote&ids=' + ids)
+        self.assertEqual(data['results'], [{'id': self.questions[1].pk, 'my_vote': 1},
+                                           {'id': self.questions[2].pk, 'my_vote': None}])
+        self.assertEqual(len(vote_queries), 1)
+
+    def test_answers(self):
+        self.client.force_login(self.users[1])
+        data, vote_queries = self._get(reverse('api:answers', kwargs={'question_pk': self.questions[0].pk}))
+        self.assertEqual({item['id']: item['my_vote'] for item in data['results']},
+                         {self.answers[0].pk: None, self.answers[1].pk: None, self.answers[2].pk: -1})
+        self.assertEqual(len(vote_queries), 1)
+
+        url = reverse('api:answer', kwargs={'question_pk': self.questions[0].pk, 'pk': self.answers[2].pk})
+        data, vote_queries = self._get(url)
+        self.assertEqual(data['my_vote'], -1)
+        self.assertEqual(len(vote_queries), 1)
+
+    def test_etag(self):
+        self.client.force_login(self.users[1])
+        url = reverse('api:questions')
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.users[0])
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+
+class TestTokens(TestCase):
+
+    BENCHMARK_REQUESTS = 20
+
+    def setUp(self):
+        _reset()
+        authentication._local_tokens.clear()
+        User = get_user_model()
+        self.user = User.objects.create(username='bob', email='bob@mail.ru', avatar='blank.png')
+        self.user.set_password('g78t87gt89g')
+        self.user.save()
+
+    def _auth(self, key):
+        return {'HTTP_AUTHORIZATION': 'Token ' + key}
+
+    def test_issue_and_revoke(self):
+        credentials = base64.b64encode(b'bob:g78t87gt89g').decode('ascii')
+        resp = self.client.post(reverse('api:tokens'), json.dumps({'name': 'phone'}),
+                                content_type='application/json', HTTP_AUTHORIZATION='Basic ' + credentials)
+        self.assertEqual(resp.status_code, 201)
+        key = resp.json()['key']
+
+        # a token cannot issue tokens or list them
+        resp = self.client.post(reverse('api:tokens'), json.dumps({'name': 'laptop'}),
+                                content_type='application/json', **self._auth(key))
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(self.client.get(reverse('api:tokens'), **self._auth(key)).status_code, 401)
+        token = ApiToken.objects.get()
+        self.assertNotEqual(token.key_hash, key)
+
+        data = json.dumps({'title': 'My Question', 'text': 'My Text', 'tags': []})
+        resp = self.client.post(reverse('api:questions'), data, content_type='application/json', **self._auth(key))
+        self.assertEqual(resp.status_code, 201)
+
+        # verified keys are served from the caches
+        with self.assertNumQueries(1):
+            TokenAuthentication().authenticate(self._request(key))
+        authentication._local_tokens.clear()
+        with self.assertNumQueries(1):
+            TokenAuthentication().authenticate(self._request(key))
+
+        resp = self.client.get(reverse('api:tokens'), HTTP_AUTHORIZATION='Basic ' + credentials)
+        self.assertEqual([item['name'] for item in resp.json()['results']], ['phone'])
+        self.assertIsNone(resp.json()['results'][0]['key'])
+
+        resp = self.client.delete(reverse('api:token', kwargs={'pk': token.pk}), **self._auth(key))
+        self.assertEqual(resp.status_code, 204)
+        self.assertTrue(ApiToken.objects.get().is_revoked)
+        resp = self.client.post(reverse('api:questions'), data, content_type='application/json', **self._auth(key))
+        self.assertEqual(resp.status_code, 401)
+
+    def test_invalid(self):
+        _, key = ApiToken.objects.issue(self.user, ttl=datetime.timedelta(seconds=-1))
+        for invalid_key in (key, 'abc', key + ' x'):
+            with self.assertRaises(AuthenticationFailed):
+                TokenAuthentication().authenticate(self._request(invalid_key))
+        self.assertIsNone(TokenAuthentication().authenticate(APIRequestFactory().get('/')))
+
+    @staticmethod
+    def _request(key):
+        return APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token ' + key)
+
+    def test_benchmark(self):
+        _, key = ApiToken.objects.issue(self.user)
+        credentials = base64.b64encode(b'bob:g78t87gt89g').decode('ascii')
+        cases = (
+            ('basic', BasicAuthentication(), APIRequestFactory().get('/', HTTP_AUTHORIZATION='Basic ' + credentials)),
+            ('token', TokenAuthentication(), self._request(key))
+        )
+        timings = {}
+        for name, backend, request in cases:
+            started = time.time()
+            for _ in xrange(self.BENCHMARK_REQUESTS):
+                user, _ = backend.authenticate(request)
+                self.assertEqual(user, self.user)
+            timings[name] = (time.time() - started) / self.BENCHMARK_REQUESTS * 1000
+        logger.info('authentication per request: basic %.2fms, token %.2fms', timings['basic'], timings['token'])
+        self.assertLess(timings['token'], timings['basic'])
+
+
+class TestThrottling(TestCase):
+
+    def setUp(self):
+        _reset()
+
+    def _drain(self, store):
+        with mock.patch('api.throttling.time.time', return_value=1000.0):
+            self.assertEqual([store.consume('k', 3, 0.5) for _ in xrange(3)], [0, 0, 0])
+            self.assertAlmostEqual(store.consume('k', 3, 0.5), 2.0)
+            self.assertEqual(store.consume('other', 3, 0.5), 0)
+        with mock.patch('api.throttling.time.time', return_value=1001.0):
+            self.assertAlmostEqual(store.consume('k', 3, 0.5), 1.0)
+        with mock.patch('api.throttling.time.time', return_value=1002.0):
+            self.assertEqual(store.consume('k', 3, 0.5), 0)
+            self.assertAlmostEqual(store.consume('k', 3, 0.5), 2.0)
+        # a long idle bucket refills up to the capacity only
+        with mock.patch('api.throttling.time.time', return_value=2000.0):
+            self.assertEqual([store.consume('k', 3, 0.5) for _ in xrange(3)], [0, 0, 0])
+            self.assertGreater(store.consume('k', 3, 0.5), 0)
+
+    def test_database_store(self):
+        self._drain(DatabaseBucketStore())
+        self.assertEqual(sorted(ThrottleBucket.objects.values_list('key', flat=True)), ['k', 'other'])
+
+    def test_local_store(self):
+        self._drain(LocalBucketStore())
+
+    def test_prune(self):
+        for store in (DatabaseBucketStore(), LocalBucketStore()):
+            with mock.patch('api.throttling.time.time', return_value=1000.0):
+                store.consume('idle', 3, 0.5)
+            with mock.patch('api.throttling.time.time', return_value=5000.0):
+                store.consume('busy', 3, 0.5)
+                self.assertEqual(store.prune(3600), 1)
+                self.assertEqual(store.prune(3600), 0)
+        self.assertEqual(list(ThrottleBucket.objects.values_list('key', flat=True)), ['busy'])
+
+    def test_prune_command(self):
+        get_store().consume('k', 3, 0.5)
+        stdout = StringIO()
+        call_command('prune_throttle_buckets', max_idle=0, stdout=stdout)
+        self.assertIn('Pruned 1 bucket(s)', stdout.getvalue())
+
+    def test_throttled_request(self):
+        url = reverse('api:questions')
+        for i in xrange(20):
+            self.assertEqual(self.client.get(url, {'page': i}).status_code, 200)
+        resp = self.client.get(url, {'page': 20})
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreater(int(resp['Retry-After']), 0)
+        # responses served from the cache are throttled as well
+        self.assertEqual(self.client.get(url, {'page': 0}).status_code, 429)
+
+    def test_long_forwarded_for(self):
+        with mock.patch('api.throttling._store', DatabaseBucketStore()):
+            resp = self.client.get(reverse('api:questions'), HTTP_X_FORWARDED_FOR='1' * 300)
+        self.assertEqual(resp.status_code, 200)
+        keys = ThrottleBucket.objects.values_list('key', flat=True)
+        self.assertTrue(keys)
+        self.assertEqual(set(len(key) for key in keys), {40})
+
+
+class TestSchema(TestCase):
+
+    def setUp(self):
+        _reset()
+        schema.clear_schema()
+        self.addCleanup(schema.clear_schema)
+
+    def test_cached(self):
+        url = reverse('api:schema') + '?format=openapi'
+        with mock.patch('api.schema.generate_schema', wraps=schema.generate_schema) as generate:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn(reverse('api:questions'), json.loads(resp.content)['paths'])
+            etag = resp['ETag']
+            self.assertEqual(self.client.get(url).content, resp.content)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(generate.call_count, 1)
+
+        resp = self.client.get(reverse('api:schema'), HTTP_ACCEPT='text/html')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('swagger', resp.content)
+
+    def _get_paths(self):
+        resp = self.client.get(reverse('api:schema') + '?format=openapi')
+        return set(json.loads(resp.content)['paths'])
+
+    def test_permissions(self):
+        User = get_user_model()
+        User.objects.create_user('bob', 'bob@mail.ru', '123', avatar='blank.png')
+        User.objects.create_user('admin', 'admin@mail.ru', '123', avatar='blank.png', is_staff=True)
+        questions, export, tokens = reverse('api:questions'), reverse('api:export'), reverse('api:tokens')
+
+        paths = self._get_paths()
+        self.assertIn(questions, paths)
+        self.assertNotIn(export, paths)
+        self.assertNotIn(tokens, paths)
+
+        self.client.login(username='bob', password='123')
+        paths = self._get_paths()
+        self.assertIn(tokens, paths)
+        self.assertNotIn(export, paths)
+
+        self.client.login(username='admin', password='123')
+        self.assertIn(export, self._get_paths())
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'schema.json')
+        call_command('api_schema', output=path)
+        with open(path, 'rb') as file_:
+            content = file_.read()
+        self.assertNotIn(reverse('api:tokens'), json.loads(content)['paths'])
+        with override_settings(API_SCHEMA_FILE=path), mock.patch('api.schema.generate_schema') as generate:
+            resp = self.client.get(reverse('api:schema') + '?format=openapi')
+            self.assertEqual(resp.content, content)
+            self.assertFalse(generate.called)
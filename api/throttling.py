@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Token bucket throttles with the buckets kept in a store shared by all the workers.
+
+A bucket holds up to 'num_requests' tokens and regains them at num_requests/duration per second;
+every request takes one. The state per key is two numbers, updated by a single statement.
+The store is set with API_THROTTLE_STORE: DatabaseBucketStore is shared by every process that
+uses the database, LocalBucketStore keeps the buckets in the process (tests, development).
+A bucket left idle for the whole throttle duration is full again, the same as a missing one,
+so the prune_throttle_buckets command deletes those without changing any decision.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Least
+from django.utils.encoding import force_bytes
+from django.utils.module_loading import import_string
+from rest_framework import throttling
+
+from .models import ThrottleBucket
+
+
+class DatabaseBucketStore(object):
+
+    def consume(self, key, capacity, rate):
+        """Takes a token from the bucket and returns 0, or the seconds until the next token if it is empty"""
+        while True:
+            now = time.time()
+            elapsed = ExpressionWrapper(Value(now) - F('updated'), output_field=FloatField())
+            refilled = Least(Value(float(capacity)), F('tokens') + elapsed * Value(rate), output_field=FloatField())
+            # the row lock of the UPDATE makes the check and the decrement atomic
+            if ThrottleBucket.objects.filter(key=key, tokens__gte=Value(1.0) - elapsed * Value(rate))\
+                    .update(tokens=refilled - Value(1.0), updated=now):
+                return 0
+            try:
+                with transaction.atomic():
+                    ThrottleBucket.objects.create(key=key, tokens=capacity - 1, updated=now)
+                return 0
+            except IntegrityError:
+                pass
+            tokens, updated = ThrottleBucket.objects.filter(key=key).values_list('tokens', 'updated').get()
+            wait = (1 - min(capacity, tokens + (now - updated) * rate)) / rate
+            if wait > 0:
+                return wait
+
+    def prune(self, max_idle):
+        """Deletes the buckets unused for max_idle seconds and returns their number"""
+        return ThrottleBucket.objects.filter(updated__lt=time.time() - max_idle).delete()[0]
+
+
+class LocalBucketStore(object):
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def prune(self, max_idle):
+        threshold = time.time() - max_idle
+        with self._lock:
+            idle = [key for key, (_, updated) in self._buckets.items() if updated < threshold]
+            for key in idle:
+                del self._buckets[key]
+        return len(idle)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.API_THROTTLE_STORE)()
+    return _store
+
+
+class TokenBucketThrottle(throttling.SimpleRateThrottle):
+    """SimpleRateThrottle with the request history replaced by a token bucket in the shared store"""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        # the key may hold a client supplied X-Forwarded-For, so it is hashed to a fixed length
+        bucket_key = hashlib.sha1(force_bytes(self.key)).hexdigest()
+        self.wait_time = get_store().consume(bucket_key, self.num_requests, self.num_requests / float(self.duration))
+        return self.wait_time == 0
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonBucketThrottle(TokenBucketThrottle, throttling.AnonRateThrottle):
+    pass
+
+
+class UserBucketThrottle(TokenBucketThrottle, throttling.UserRateThrottle):
+    pass
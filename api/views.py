@@ -1,64 +1,220 @@
 # -*- coding: utf-8 -*-
+import re
+
+from django.db.models import F, Prefetch, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.text import compress_sequence
 from rest_framework import generics
 from rest_framework import filters
+from rest_framework import permissions
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import CoreJSONRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_swagger.renderers import OpenAPIRenderer, SwaggerUIRenderer
+
+from hasker import generations
+from hasker.export import export_questions
+from hasker.models import Question, Answer, QuestionVote, AnswerVote, Tag
+from .cache import AnonymousCacheMixin
+from .filters import FullTextSearchFilter, SparseFieldsFilter
+from .mixins import BatchListMixin, ConditionalListMixin, FlatListMixin, MyVoteMixin
+from .models import ApiToken
+from .pagination import KeysetCursorPagination
+from .renderers import NDJSONRenderer
+from .schema import SCHEMA_FORMATS, get_schema
+from .serializers import QuestionSerializer, AnswerSerializer, ApiTokenSerializer
+
 
-from hasker.models import Question, Answer
-from .serializers import QuestionSerializer, AnswerSerializer
+# in the order the flat read path renders them
+ORDERED_TAGS = Prefetch('tags', queryset=Tag.objects.order_by('name'))
 
 
-class QuestionList(generics.ListCreateAPIView):
+class QuestionList(AnonymousCacheMixin, BatchListMixin, MyVoteMixin, FlatListMixin, ConditionalListMixin,
+                   generics.ListCreateAPIView):
     """
     get:
-    Return a list of the questions.
+    Return a list of the questions, or the questions with the given ?ids=1,2,3.
 
     post:
     Create a new question.
     """
-    queryset = Question.objects.all()
+    queryset = Question.objects.select_related('author').prefetch_related(ORDERED_TAGS)
     serializer_class = QuestionSerializer
-    filter_backends = (filters.OrderingFilter, filters.SearchFilter)
+    vote_model = QuestionVote
+    vote_target = 'question'
+    filter_backends = (filters.OrderingFilter, FullTextSearchFilter, SparseFieldsFilter)
     ordering_fields = ('creation_date', 'rating')
-    search_fields = ('title', 'text')
+    ordering = ('-creation_date',)
+    pagination_class = KeysetCursorPagination
+    etag_fields = ('id', 'title', 'text', 'author.username', 'tags', 'rating', 'creation_date', 'accepted_answer_id')
+
+    def get_cache_generation_keys(self):
+        return [generations.QUESTIONS_KEY]
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
 
-class QuestionDetail(generics.RetrieveAPIView):
+class QuestionDetail(AnonymousCacheMixin, MyVoteMixin, generics.RetrieveAPIView):
     """
     get:
     Return a question.
     """
-    queryset = Question.objects.all()
+    queryset = Question.objects.select_related('author').prefetch_related(ORDERED_TAGS)
     serializer_class = QuestionSerializer
+    vote_model = QuestionVote
+    vote_target = 'question'
+    filter_backends = (SparseFieldsFilter,)
+
+    def get_cache_generation_keys(self):
+        return [generations.QUESTION_KEY.format(self.kwargs['pk'])]
 
 
-class AnswerList(generics.ListCreateAPIView):
+class AnswerList(AnonymousCacheMixin, BatchListMixin, MyVoteMixin, FlatListMixin, ConditionalListMixin,
+                 generics.ListCreateAPIView):
     """
     get:
-    Return a list of the answers for a question.
+    Return a list of the answers for a question, or the answers with the given ?ids=1,2,3.
+    The accepted answer comes first on the first page.
 
     post:
     Create a new answer for a question.
     """
     serializer_class = AnswerSerializer
+    vote_model = AnswerVote
+    vote_target = 'answer'
+    filter_backends = (SparseFieldsFilter,)
+    pagination_class = KeysetCursorPagination
+    etag_fields = ('id', 'text', 'author.username', 'rating', 'creation_date')
+
+    def get_cache_generation_keys(self):
+        return [generations.QUESTION_KEY.format(self.kwargs['question_pk'])]
 
     def get_queryset(self):
         question_pk = self.kwargs['question_pk']
-        return Answer.objects.filter(question=question_pk).order_by('-rating', '-creation_date')
+        return Answer.objects.filter(question=question_pk).select_related('author')\
+            .order_by('-rating', '-creation_date', '-id')
+
+    def paginate_queryset(self, queryset):
+        accepted = Q(question__accepted_answer=F('id'))
+        page = super(AnswerList, self).paginate_queryset(queryset.exclude(accepted))
+        if page is not None and not self.paginator.page.has_previous():
+            pinned = list(queryset.filter(accepted))
+            self.load_my_votes(pinned)
+            page[:0] = pinned
+        return page
 
     def perform_create(self, serializer):
         question_pk = self.kwargs['question_pk']
         serializer.save(question_id=question_pk, author=self.request.user)
 
 
-class AnswerDetail(generics.RetrieveAPIView):
+class AnswerDetail(AnonymousCacheMixin, MyVoteMixin, generics.RetrieveAPIView):
     """
     get:
     Return an answer.
     """
     serializer_class = AnswerSerializer
+    vote_model = AnswerVote
+    vote_target = 'answer'
+    filter_backends = (SparseFieldsFilter,)
+
+    def get_cache_generation_keys(self):
+        return [generations.QUESTION_KEY.format(self.kwargs['question_pk'])]
 
     def get_queryset(self):
         question_pk = self.kwargs['question_pk']
-        return Answer.objects.filter(question=question_pk)
+        return Answer.objects.filter(question=question_pk).select_related('author')
+
+
+class QuestionExport(APIView):
+    """
+    get:
+    Stream all the questions with their tags, votes and answers as NDJSON, one question per line,
+    in id order. Pass ?after=<id> of the last received question to resume an interrupted export.
+    Clients accepting application/json get the same NDJSON body.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+    renderer_classes = (NDJSONRenderer, JSONRenderer)
+
+    _gzip_re = re.compile(r'\bgzip\b')
+
+    def get(self, request):
+        try:
+            after_id = int(request.query_params.get('after', 0))
+        except ValueError:
+            raise ParseError('The after parameter must be an integer')
+        lines = (line.encode('utf-8') for line in export_questions(after_id))
+        if self._gzip_re.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = StreamingHttpResponse(compress_sequence(lines), content_type=NDJSONRenderer.media_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = StreamingHttpResponse(lines, content_type=NDJSONRenderer.media_type)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class TokenList(generics.ListCreateAPIView):
+    """
+    get:
+    Return a list of the user's active API tokens.
+
+    post:
+    Issue a new API token. The key is only shown in this response; send it as "Authorization: Token <key>".
+    """
+    # the password is required, so a leaked token cannot be used to issue more of them
+    authentication_classes = (BasicAuthentication, SessionAuthentication)
+    serializer_class = ApiTokenSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return ApiToken.objects.filter(user=self.request.user, is_revoked=False, expiration_date__gt=timezone.now())\
+            .order_by('-creation_date')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class TokenDetail(generics.RetrieveDestroyAPIView):
+    """
+    get:
+    Return an API token.
+
+    delete:
+    Revoke an API token.
+    """
+    serializer_class = ApiTokenSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return ApiToken.objects.filter(user=self.request.user, is_revoked=False)
+
+    def perform_destroy(self, instance):
+        instance.revoke()
+
+
+class SchemaView(APIView):
+    """
+    Swagger UI of the API, and the schema it loads (?format=openapi) or its Core JSON document,
+    listing the endpoints the user may use, served from the schema generated once per process and profile.
+    """
+    _ignore_model_permissions = True
+    exclude_from_schema = True
+    permission_classes = (permissions.AllowAny,)
+    renderer_classes = (CoreJSONRenderer, OpenAPIRenderer, SwaggerUIRenderer)
+
+    def get(self, request):
+        format_ = request.accepted_renderer.format
+        if format_ not in SCHEMA_FORMATS:
+            return Response()
+        document = get_schema(format_, request)
+        response = get_conditional_response(request, etag=document.etag)
+        if response is None:
+            response = HttpResponse(document.content, content_type=document.content_type)
+        response['ETag'] = document.etag
+        patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
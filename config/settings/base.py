@@ -143,11 +143,12 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
+        'api.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication'
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'api.throttling.AnonBucketThrottle',
+        'api.throttling.UserBucketThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '20/minute',
@@ -155,3 +156,15 @@ REST_FRAMEWORK = {
     },
     'PAGE_SIZE': 10
 }
+
+# Lifetime of the issued API tokens
+API_TOKEN_TTL_DAYS = 30
+
+# Where the API throttles keep their token buckets, shared by all the workers
+API_THROTTLE_STORE = 'api.throttling.DatabaseBucketStore'
+
+# Render the API lists through the flat values_list path (api.flat) where the serializer allows
+API_FLAT_READ = True
+
+# Pregenerated OpenAPI schema of the API (manage.py api_schema --output), generated on the first request if unset
+API_SCHEMA_FILE = None
@@ -11,3 +11,13 @@ ALLOWED_HOSTS = ['localhost']
 
 STATIC_ROOT = '/usr/local/hasker/static/'
 MEDIA_ROOT = '/usr/local/hasker/media/'
+
+# Shared by all the workers: the generation counters, the page locks and the token cache rely on it
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    }
+}
+
+API_SCHEMA_FILE = '/usr/local/hasker/static/api-schema.json'
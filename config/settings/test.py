@@ -4,3 +4,5 @@ from .base import *
 DEBUG = False
 
 ALLOWED_HOSTS = ['example.com']
+
+API_THROTTLE_STORE = 'api.throttling.LocalBucketStore'
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 
 class HaskerConfig(AppConfig):
     name = 'hasker'
+
+    def ready(self):
+        from . import checks  # registers the system checks
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core import checks
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The trending block, the generation counters and the page locks are invalidated and taken
+    through the default cache, so every worker has to see the same one.
+    """
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        'The default cache is local to every process, so the cached pages, lists and the trending block '
+        'are only invalidated in the worker that handled the write.',
+        hint='Configure a cache shared by the workers, such as memcached, in CACHES.',
+        id='hasker.W001'
+    )]
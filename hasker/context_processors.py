@@ -1,7 +1,7 @@
-from .models import Question
+from .trending import get_trending
 
 
 def trending(req):
     return {
-        'trending': Question.objects.order_by('-rating', '-creation_date')[:20]
+        'trending': get_trending()
     }
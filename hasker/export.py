@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export of questions as NDJSON: one JSON object per line with the question's tags, vote
+counts and answers. Questions are read in id order with a server-side cursor and their
+relations are loaded per batch, so memory use does not depend on the table size.
+An interrupted export resumes by passing the id of the last exported question as 'after_id'.
+"""
+import itertools
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+
+from .models import Question, Answer, QuestionVote, AnswerVote
+
+
+BATCH_SIZE = 500
+
+_QUESTION_FIELDS = ('id', 'title', 'slug', 'text', 'author__username', 'creation_date', 'rating', 'answers_num',
+                    'accepted_answer_id')
+_ANSWER_FIELDS = ('id', 'question_id', 'text', 'author__username', 'creation_date', 'rating')
+
+_NO_VOTES = {'up': 0, 'down': 0}
+
+
+_encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def export_questions(after_id=0, batch_size=BATCH_SIZE):
+    """Yields an NDJSON line for every question with an id greater than 'after_id'"""
+    for question in iter_questions(after_id, batch_size):
+        yield to_line(question)
+
+
+def iter_questions(after_id=0, batch_size=BATCH_SIZE):
+    rows = Question.objects.filter(id__gt=after_id).order_by('id').values_list(*_QUESTION_FIELDS).iterator()
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        for question in _build_questions(batch):
+            yield question
+
+
+def to_line(question):
+    return _encoder.encode(question) + u'\n'
+
+
+def _build_questions(rows):
+    ids = [row[0] for row in rows]
+    tags = {}
+    for question_id, name in Question.tags.through.objects.filter(question_id__in=ids)\
+            .order_by('question_id', 'tag__name').values_list('question_id', 'tag__name'):
+        tags.setdefault(question_id, []).append(name)
+    votes = _count_votes(QuestionVote.objects.filter(question_id__in=ids), 'question_id')
+    answers = {}
+    for answer in Answer.objects.filter(question_id__in=ids).order_by('id').values_list(*_ANSWER_FIELDS):
+        answers.setdefault(answer[1], []).append(answer)
+    answer_votes = _count_votes(AnswerVote.objects.filter(answer__question_id__in=ids), 'answer_id')
+    for question_id, title, slug, text, author, creation_date, rating, answers_num, accepted_answer_id in rows:
+        yield {
+            'id': question_id,
+            'title': title,
+            'slug': slug,
+            'text': text,
+            'author': author,
+            'creation_date': creation_date,
+            'rating': rating,
+            'answers_num': answers_num,
+            'tags': tags.get(question_id, []),
+            'votes': votes.get(question_id, _NO_VOTES),
+            'answers': [{
+                'id': answer_id,
+                'text': answer_text,
+                'author': answer_author,
+                'is_correct': answer_id == accepted_answer_id,
+                'creation_date': answer_date,
+                'rating': answer_rating,
+                'votes': answer_votes.get(answer_id, _NO_VOTES)
+            } for answer_id, _, answer_text, answer_author, answer_date, answer_rating
+                in answers.get(question_id, [])]
+        }
+
+
+def _count_votes(votes, key):
+    counts = {}
+    for target_id, value, num in votes.order_by().values_list(key, 'value').annotate(num=Count('id')):
+        target_votes = counts.setdefault(target_id, dict(_NO_VOTES))
+        target_votes['up' if value > 0 else 'down'] = num
+    return counts
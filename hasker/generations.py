@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Generation counters of cached question data.
+
+Cached content stores the generations it was built with in its key, so bumping a counter
+makes every dependent entry unreachable at once instead of deleting entries one by one.
+The list generation changes with anything the question lists show, a question generation
+with anything shown on that question's page (including its answers).
+
+The counters are only seen by the processes sharing the cache backend, so production runs
+on memcached (see config.settings.production) rather than the per-process default.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+QUESTIONS_KEY = 'hasker:gen:questions'
+QUESTION_KEY = 'hasker:gen:question:{0}'
+
+
+def get_generations(keys):
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        initial = _initial_generation()
+        for key in missing:
+            cache.add(key, initial, None)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key, 0) for key in keys]
+
+
+def question_changed(question_id, listed=False):
+    """Invalidates the cached data of the question, and the question lists if 'listed' is set"""
+    keys = [QUESTION_KEY.format(question_id)]
+    if listed:
+        keys.append(QUESTIONS_KEY)
+    _changed(keys)
+
+
+def questions_changed():
+    """Invalidates the cached question lists"""
+    _changed([QUESTIONS_KEY])
+
+
+def _changed(keys):
+    _bump(keys)
+    # a reader between the bump above and the commit could still cache the old rows
+    # under the new generation, so the counters are bumped again once they are visible
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # evicted counters restart from the clock, so they never return to a used value
+            cache.add(key, _initial_generation(), None)
+
+
+def _initial_generation():
+    return int(time.time() * 1000)
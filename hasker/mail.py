@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import datetime
+import logging
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingMail
+
+
+MAX_ATTEMPTS = 8
+SEND_TIMEOUT = datetime.timedelta(minutes=10)
+_RECIPIENT_SEPARATOR = '\n'
+
+logger = logging.getLogger(__name__)
+
+
+def queue_mail(subject, message, from_email, recipient_list, html_message=None):
+    return OutgoingMail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or u'',
+        from_email=from_email,
+        to=_RECIPIENT_SEPARATOR.join(recipient_list)
+    )
+
+
+def send_queued_mail(batch_size=100):
+    """
+    Sends up to batch_size due messages over one SMTP connection and returns the number of the processed ones.
+    Failed messages are retried with exponential backoff until MAX_ATTEMPTS is reached and then dropped.
+    """
+    _purge_exhausted()
+    mails = _claim(batch_size)
+    if not mails:
+        return 0
+    sent = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        for mail in mails:
+            _postpone(mail, exc)
+        return len(mails)
+    try:
+        for mail in mails:
+            try:
+                connection.send_messages([_make_message(mail, connection)])
+                sent.append(mail.id)
+            except Exception as exc:
+                _postpone(mail, exc)
+    finally:
+        connection.close()
+    OutgoingMail.objects.filter(id__in=sent).delete()
+    return len(mails)
+
+
+def _claim(batch_size):
+    """
+    Takes the due messages for this worker in a short transaction, so SMTP runs without row locks held.
+    The attempt is counted and the messages are hidden from the other workers for SEND_TIMEOUT,
+    after which the ones a crashed worker left behind become due again.
+    """
+    with transaction.atomic():
+        mails = list(OutgoingMail.objects.select_for_update(skip_locked=True)
+                     .filter(next_attempt__lte=timezone.now(), attempts__lt=MAX_ATTEMPTS)
+                     .order_by('next_attempt')[:batch_size])
+        if mails:
+            next_attempt = timezone.now() + SEND_TIMEOUT
+            OutgoingMail.objects.filter(id__in=[mail.id for mail in mails])\
+                .update(attempts=F('attempts') + 1, next_attempt=next_attempt)
+            for mail in mails:
+                mail.attempts += 1
+                mail.next_attempt = next_attempt
+    return mails
+
+
+def _purge_exhausted():
+    """
+    Drops the messages whose last attempt was left behind by a crashed worker, they are never due again.
+    """
+    exhausted = OutgoingMail.objects.filter(attempts__gte=MAX_ATTEMPTS, next_attempt__lte=timezone.now())
+    for mail in exhausted:
+        _log_dropped(mail)
+    exhausted.delete()
+
+
+def _make_message(mail, connection):
+    message = EmailMultiAlternatives(mail.subject, mail.body, mail.from_email,
+                                     mail.to.split(_RECIPIENT_SEPARATOR), connection=connection)
+    if mail.html_body:
+        message.attach_alternative(mail.html_body, 'text/html')
+    return message
+
+
+def _postpone(mail, exc):
+    mail.last_error = repr(exc)
+    if mail.attempts >= MAX_ATTEMPTS:
+        _log_dropped(mail)
+        mail.delete()
+        return
+    mail.next_attempt = timezone.now() + datetime.timedelta(minutes=2 ** mail.attempts)
+    mail.save(update_fields=['next_attempt', 'last_error'])
+
+
+def _log_dropped(mail):
+    logger.error('Dropping mail %r to %s after %d attempts: %s',
+                 mail.subject, mail.to.replace(_RECIPIENT_SEPARATOR, ', '), mail.attempts, mail.last_error)
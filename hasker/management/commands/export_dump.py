@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import gzip
+
+from django.core.management.base import BaseCommand
+
+from hasker.export import iter_questions, to_line, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Writes the questions with their tags, votes and answers as NDJSON (gzipped for a .gz output)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write to instead of the standard output')
+        parser.add_argument('--after-id', type=int, default=0,
+                            help='Resume after the question with this id, appending to the output')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if output is None:
+            return self._export(lambda data: self.stdout.write(data, ending=''), options)
+        mode = 'ab' if options['after_id'] else 'wb'
+        with (gzip.open(output, mode) if output.endswith('.gz') else open(output, mode)) as file_:
+            self._export(file_.write, options)
+
+    def _export(self, write, options):
+        num = 0
+        last_id = options['after_id']
+        for question in iter_questions(options['after_id'], options['batch_size']):
+            write(to_line(question).encode('utf-8'))
+            num += 1
+            last_id = question['id']
+        self.stderr.write('Exported {0:d} question(s), the last id is {1:d}'.format(num, last_id))
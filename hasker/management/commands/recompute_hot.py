@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from hasker import generations
+from hasker.models import Question
+from hasker.ranking import recompute_hot_scores, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Recalculates Question.hot_score in batches, fixing the scores that drifted or follow an old formula'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fixed = recompute_hot_scores(Question, options['batch_size'])
+        if fixed:
+            generations.questions_changed()
+        self.stdout.write('Fixed {0:d} question(s)'.format(fixed))
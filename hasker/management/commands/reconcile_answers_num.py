@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from hasker import generations, ranking
+from hasker.models import Question, Answer
+
+
+class Command(BaseCommand):
+    help = 'Recalculates Question.answers_num from the answer table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        fixed = 0
+        while True:
+            with transaction.atomic():
+                questions = list(Question.objects.filter(id__gt=last_id).order_by('id')
+                                 .select_for_update().values_list('id', 'answers_num')[:batch_size])
+                if not questions:
+                    break
+                ids = [question_id for question_id, _ in questions]
+                counts = dict(Answer.objects.filter(question_id__in=ids).order_by()
+                              .values('question_id').annotate(num=Count('id')).values_list('question_id', 'num'))
+                for question_id, answers_num in questions:
+                    actual = counts.get(question_id, 0)
+                    if actual != answers_num:
+                        Question.objects.filter(id=question_id).update(answers_num=actual)
+                        ranking.refresh_hot_score(Question, question_id)
+                        generations.question_changed(question_id, listed=True)
+                        fixed += 1
+            last_id = ids[-1]
+        self.stdout.write('Fixed {0:d} question(s)'.format(fixed))
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from hasker.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Delivers messages from the outbox in batches over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls of an empty outbox')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = send_queued_mail(options['batch_size'])
+            if not options['loop']:
+                self.stdout.write('Processed {0:d} message(s)'.format(processed))
+                return
+            if processed < options['batch_size']:
+                time.sleep(options['interval'])
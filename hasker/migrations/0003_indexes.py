@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 18:58
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    # Concurrent votes could create several rows per (target, user) before the unique constraint existed.
+    # Keep the newest row and recompute the rating of every affected target from the remaining rows.
+    for vote_model_name, target_model_name, target_field in (('QuestionVote', 'Question', 'question'),
+                                                            ('AnswerVote', 'Answer', 'answer')):
+        vote_model = apps.get_model('hasker', vote_model_name)
+        target_model = apps.get_model('hasker', target_model_name)
+        target_attr = target_field + '_id'
+        duplicates = vote_model.objects.values(target_attr, 'user_id').order_by()\
+            .annotate(num=Count('id'), last_id=Max('id')).filter(num__gt=1)
+        target_ids = set()
+        for row in duplicates:
+            vote_model.objects.filter(**{target_attr: row[target_attr], 'user_id': row['user_id']})\
+                .exclude(id=row['last_id']).delete()
+            target_ids.add(row[target_attr])
+        for target_id in target_ids:
+            rating = vote_model.objects.filter(**{target_attr: target_id}).aggregate(s=Sum('value'))['s'] or 0
+            target_model.objects.filter(id=target_id).update(rating=rating)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('hasker', '0002_question_answers_num'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='answervote',
+            unique_together=set([('answer', 'user')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='questionvote',
+            unique_together=set([('question', 'user')]),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=[b'-rating', b'-creation_date', b'-id'], name=b'question_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=[b'-creation_date', b'-id'], name=b'question_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=[b'question', b'-rating', b'-creation_date'], name=b'answer_question_order_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 19:00
+from __future__ import unicode_literals
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+import django.db.models.deletion
+
+from hasker.search import tokenize, TITLE_WEIGHT, TEXT_WEIGHT
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX question_search_idx ON hasker_question USING gin (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX question_search_idx')
+
+
+def fill_search_index(apps, schema_editor):
+    Question = apps.get_model('hasker', 'Question')
+    SearchTerm = apps.get_model('hasker', 'SearchTerm')
+    if schema_editor.connection.vendor == 'postgresql':
+        Question.objects.update(search_vector=SearchVector('title', weight='A') + SearchVector('text', weight='B'))
+        return
+    for question in Question.objects.only('id', 'title', 'text').iterator():
+        weights = {}
+        for term in tokenize(question.title):
+            weights[term] = TITLE_WEIGHT
+        for term in set(tokenize(question.text)):
+            weights[term] = weights.get(term, 0) + TEXT_WEIGHT
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, question_id=question.id, weight=weight) for term, weight in weights.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hasker', '0003_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='searchterm',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hasker.Question'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchterm',
+            unique_together=set([('term', 'question')]),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 19:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hasker', '0005_outgoingmail'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='answer',
+            name=b'answer_question_order_idx',
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=[b'question', b'-rating', b'-creation_date', b'-id'], name=b'answer_question_order_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 19:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_correct_answers(apps, schema_editor):
+    Question = apps.get_model('hasker', 'Question')
+    Answer = apps.get_model('hasker', 'Answer')
+    for question_id, answer_id in Answer.objects.filter(is_correct=True).values_list('question_id', 'id').iterator():
+        Question.objects.filter(id=question_id).update(accepted_answer=answer_id)
+
+
+def copy_accepted_answers(apps, schema_editor):
+    Question = apps.get_model('hasker', 'Question')
+    Answer = apps.get_model('hasker', 'Answer')
+    Answer.objects.filter(id__in=Question.objects.exclude(accepted_answer=None).values('accepted_answer'))\
+        .update(is_correct=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hasker', '0006_answer_order_idx_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='accepted_answer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='hasker.Answer'),
+        ),
+        migrations.RunPython(copy_correct_answers, copy_accepted_answers),
+        migrations.RemoveField(
+            model_name='answer',
+            name='is_correct',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 19:57
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from hasker.ranking import recompute_hot_scores
+
+
+def fill_hot_scores(apps, schema_editor):
+    recompute_hot_scores(apps.get_model('hasker', 'Question'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hasker', '0008_question_accepted_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=[b'-hot_score', b'-id'], name=b'question_hot_score_idx'),
+        ),
+    ]
@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
+import collections
 import itertools
 
 from django.conf import settings
-from django.db import models, transaction
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Length
 from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 
+from . import generations, ranking, search, trending
+from .pagination import KeysetPaginator
+
 
 class QuestionVote(models.Model):
     POSITIVE = 1
@@ -19,6 +26,9 @@ class QuestionVote(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
     value = models.SmallIntegerField(choices=_VALUE_CHOICES)
 
+    class Meta:
+        unique_together = ('question', 'user')
+
 
 class AnswerVote(models.Model):
     POSITIVE = 1
@@ -31,8 +41,61 @@ class AnswerVote(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
     value = models.SmallIntegerField(choices=_VALUE_CHOICES)
 
+    class Meta:
+        unique_together = ('answer', 'user')
+
+
+def _cast_vote(vote_model, value, **lookup):
+    """
+    Withdraws, flips or creates the user's vote with single row statements and returns the rating delta.
+    The unique (target, user) constraint turns a concurrent duplicate insert into a retry.
+    """
+    votes = vote_model.objects.filter(**lookup)
+    while True:
+        if votes.filter(value=value).delete()[0]:
+            return -value
+        if votes.exclude(value=value).update(value=value):
+            return 2 * value
+        try:
+            with transaction.atomic():
+                vote_model.objects.create(value=value, **lookup)
+            return value
+        except IntegrityError:
+            continue
+
+
+def _add_rating(model, pk, delta):
+    rows = model.objects.filter(pk=pk)
+    rows.update(rating=F('rating') + delta)
+    return rows.values_list('rating', flat=True).get()
+
+
+class TagManager(models.Manager):
+
+    def get_or_create_all(self, names):
+        """Returns the tags with the given names, creating the missing ones in bulk"""
+        names = list(collections.OrderedDict.fromkeys(names))
+        tags = {tag.name: tag for tag in self.filter(name__in=names)}
+        while len(tags) < len(names):
+            missing = [name for name in names if name not in tags]
+            try:
+                with transaction.atomic():
+                    self.bulk_create([Tag(name=name) for name in missing])
+            except IntegrityError:
+                # a concurrent request has created some of them, fetch those and try again
+                created = list(self.filter(name__in=missing))
+                if not created:
+                    raise
+                tags.update((tag.name, tag) for tag in created)
+                continue
+            tags.update((tag.name, tag) for tag in self.filter(name__in=missing))
+        return [tags[name] for name in names]
+
 
 class Tag(models.Model):
+
+    objects = TagManager()
+
     name = models.CharField(max_length=30, unique=True)
 
     def url(self):
@@ -44,21 +107,21 @@ class QuestionManager(models.Manager):
     @transaction.atomic
     def create(self, title, text, author, tag_names):
         question = super(QuestionManager, self).create(title=title, text=text, author=author)
-        for tag_name in tag_names:
-            tag, created = Tag.objects.get_or_create(name=tag_name)
-            question.tags.add(tag)
-        question.save()
+        if tag_names:
+            QuestionTag = Question.tags.through
+            QuestionTag.objects.bulk_create([
+                QuestionTag(question_id=question.id, tag_id=tag.id) for tag in Tag.objects.get_or_create_all(tag_names)])
+        trending.rating_changed(question.id, question.rating)
         return question
 
-    @transaction.atomic
     def get(self, user=None, **kwargs):
-        question = self.prefetch_related('author', 'tags').get(**kwargs)
-        question.vote = None
+        """Returns the question with its author, tags and the user's vote in two queries"""
+        questions = self.select_related('author').prefetch_related('tags')
         if user:
-            try:
-                question.vote = QuestionVote.objects.get(question=question, user=user).value
-            except QuestionVote.DoesNotExist:
-                pass
+            votes = QuestionVote.objects.filter(question=OuterRef('pk'), user=user).values('value')[:1]
+            return questions.annotate(vote=Subquery(votes, output_field=models.SmallIntegerField())).get(**kwargs)
+        question = questions.get(**kwargs)
+        question.vote = None
         return question
 
 
@@ -67,6 +130,10 @@ class Question(models.Model):
     objects = QuestionManager()
 
     _MAX_SLUG_LENGTH = 255
+    _MAX_SLUG_SUFFIX_DIGITS = 10
+    _SLUG_ATTEMPTS = 5
+    # written by their own UPDATEs (F() counters, mark_correct, the search index), never by save()
+    _UPDATED_IN_PLACE = ('rating', 'answers_num', 'hot_score', 'accepted_answer', 'search_vector')
 
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=_MAX_SLUG_LENGTH, unique=True)
@@ -75,100 +142,171 @@ class Question(models.Model):
     creation_date = models.DateTimeField(default=timezone.now)
     tags = models.ManyToManyField(Tag)
     rating = models.IntegerField(default=0)
+    answers_num = models.IntegerField(default=0)
+    accepted_answer = models.ForeignKey('Answer', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    hot_score = models.FloatField(default=0)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating', '-creation_date', '-id'], name='question_hot_idx'),
+            models.Index(fields=['-creation_date', '-id'], name='question_new_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='question_hot_score_idx'),
+        ]
 
     @transaction.atomic
     def vote(self, user, value):
         if self.author_id == user.id:
             raise ValueError()
-        try:
-            vote = QuestionVote.objects.get(question=self, user=user)
-            if vote.value == value:
-                self.rating -= vote.value
-                self.save()
-                vote.delete()
-            else:
-                self.rating += value - vote.value
-                self.save()
-                vote.value = value
-                vote.save()
-        except QuestionVote.DoesNotExist:
-            QuestionVote.objects.create(question=self, user=user, value=value)
-            self.rating += value
-            self.save()
+        delta = _cast_vote(QuestionVote, value, question=self, user=user)
+        self.rating = _add_rating(Question, self.pk, delta)
+        self.hot_score = ranking.refresh_hot_score(Question, self.pk)
+        trending.rating_changed(self.id, self.rating)
+        generations.question_changed(self.id, listed=True)
         return self.rating
 
-    def get_answers(self, offset, limit, user=None):
-        answers = self.answer_set.prefetch_related('author')[offset:offset+limit]
-        if user:
-            votes = AnswerVote.objects.filter(answer__in=answers, user=user)
-        else:
-            votes = []
-        answerid_to_votevalue = {vote.answer_id: vote.value for vote in votes}
+    def get_answers(self, cursor=None, user=None, per_page=30):
+        """
+        Returns the KeysetPage of the answers at the cursor, with the user's votes on that page only.
+        The accepted answer is left out of the pages and put on top of the first one.
+        """
+        answers = self.answer_set.select_related('author')
+        if self.accepted_answer_id is not None:
+            answers = answers.exclude(id=self.accepted_answer_id)
+        answers = KeysetPaginator(answers, ('rating', 'creation_date', 'id'), per_page).page(cursor)
+        if self.accepted_answer_id is not None and not answers.has_previous():
+            answers.object_list[:0] = self.answer_set.select_related('author').filter(id=self.accepted_answer_id)
+        votes = {}
+        if user and answers.object_list:
+            votes = dict(AnswerVote.objects.filter(answer__in=[answer.id for answer in answers], user=user)
+                         .values_list('answer_id', 'value'))
         for answer in answers:
-            answer.vote = answerid_to_votevalue.get(answer.id, None)
+            answer.question = self
+            answer.vote = votes.get(answer.id)
         return answers
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Question, cls).from_db(db, field_names, values)
+        instance._indexed_content = (instance.__dict__.get('title'), instance.__dict__.get('text'))
+        return instance
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         if self.pk is None:
+            self._insert_with_unique_slug(*args, **kwargs)
+        else:
+            if kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+                # a full save would overwrite concurrent updates of those with a stale copy
+                deferred = self.get_deferred_fields()
+                kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                           if not field.primary_key and field.name not in self._UPDATED_IN_PLACE
+                                           and field.attname not in deferred]
+            super(Question, self).save(*args, **kwargs)
+        if (self.title, self.text) != getattr(self, '_indexed_content', None):
+            search.index_question(self)
+            self._indexed_content = (self.title, self.text)
+        generations.question_changed(self.id, listed=True)
+
+    def _insert_with_unique_slug(self, *args, **kwargs):
+        self.hot_score = ranking.hot_score(self.rating, self.answers_num, self.creation_date)
+        # a concurrent insert may take the same slug between the lookup and the INSERT
+        for attempt in itertools.count(1):
             self.slug = self._get_unique_slug()
-        super(Question, self).save(*args, **kwargs)
+            try:
+                with transaction.atomic():
+                    return super(Question, self).save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == self._SLUG_ATTEMPTS:
+                    raise
 
     def _get_unique_slug(self):
         slugified_title = slugify(self.title, True)
-        unique_slug = slugified_title[:self._MAX_SLUG_LENGTH]
-        for num in itertools.count(1):
-            if not Question.objects.filter(slug=unique_slug).exists():
-                break
-            num = str(num)
-            unique_slug = slugified_title[:self._MAX_SLUG_LENGTH - 1 - len(num)] + '-' + num
-        return unique_slug
+        slug = slugified_title[:self._MAX_SLUG_LENGTH]
+        stem = slugified_title[:self._MAX_SLUG_LENGTH - 1 - self._MAX_SLUG_SUFFIX_DIGITS] + '-'
+        # slugs consist of word characters and hyphens only, so the stem needs no escaping;
+        # among '<stem><digits>' slugs the longest, then the greatest, has the highest suffix.
+        # Longer numbers come from titles; leaving them out keeps the next suffix within the digits
+        suffixed_lookup = Q(slug__startswith=stem,
+                            slug__regex=u'^{0}[0-9]{{1,{1:d}}}$'.format(stem, self._MAX_SLUG_SUFFIX_DIGITS - 1))
+        taken = list(Question.objects.filter(Q(slug=slug) | suffixed_lookup)
+                     .order_by(Length('slug').desc(), '-slug').values_list('slug', flat=True)[:2])
+        if not taken:
+            return slug
+        suffixed = [taken_slug for taken_slug in taken if taken_slug != slug]
+        num = int(suffixed[0][len(stem):]) + 1 if suffixed else 1
+        return stem + str(num)
 
     def url(self):
         return reverse('question', args=[self.slug])
 
 
+class SearchTerm(models.Model):
+    """Inverted index entry used for searching when the database is not PostgreSQL"""
+    term = models.CharField(max_length=50)
+    question = models.ForeignKey(Question)
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('term', 'question')
+
+
 class Answer(models.Model):
     question = models.ForeignKey(Question)
     text = models.TextField()
     author = models.ForeignKey(settings.AUTH_USER_MODEL)
-    is_correct = models.BooleanField(default=False)
     creation_date = models.DateTimeField(default=timezone.now)
     rating = models.IntegerField(default=0)
 
     class Meta:
         ordering = ('-rating', '-creation_date')
+        indexes = [
+            models.Index(fields=['question', '-rating', '-creation_date', '-id'], name='answer_question_order_idx'),
+        ]
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        super(Answer, self).save(*args, **kwargs)
+        if is_new:
+            Question.objects.filter(pk=self.question_id).update(answers_num=F('answers_num') + 1)
+            ranking.refresh_hot_score(Question, self.question_id)
+        generations.question_changed(self.question_id, listed=is_new)
 
     @transaction.atomic
+    def delete(self, *args, **kwargs):
+        Question.objects.filter(pk=self.question_id).update(answers_num=F('answers_num') - 1)
+        ranking.refresh_hot_score(Question, self.question_id)
+        generations.question_changed(self.question_id, listed=True)
+        return super(Answer, self).delete(*args, **kwargs)
+
+    @property
+    def is_correct(self):
+        return self.question.accepted_answer_id == self.id
+
     def mark_correct(self, user):
-        if self.question.author_id != user.id:
+        if not Question.objects.filter(pk=self.question_id, author=user).update(accepted_answer=self):
             raise ValueError()
-        try:
-            correct_answer = Answer.objects.get(question=self.question_id, is_correct=True)
-            correct_answer.is_correct = False
-            correct_answer.save()
-        except self.DoesNotExist:
-            pass
-        self.is_correct = True
-        self.save()
+        generations.question_changed(self.question_id, listed=True)
 
     @transaction.atomic
     def vote(self, user, value):
         if self.author_id == user.id:
             raise ValueError()
-        try:
-            vote = AnswerVote.objects.get(answer=self, user=user)
-            if vote.value == value:
-                self.rating -= vote.value
-                self.save()
-                vote.delete()
-            else:
-                self.rating += value - vote.value
-                self.save()
-                vote.value = value
-                vote.save()
-        except AnswerVote.DoesNotExist:
-            AnswerVote.objects.create(answer=self, user=user, value=value)
-            self.rating += value
-            self.save()
+        delta = _cast_vote(AnswerVote, value, answer=self, user=user)
+        self.rating = _add_rating(Answer, self.pk, delta)
+        generations.question_changed(self.question_id)
         return self.rating
 
+
+class OutgoingMail(models.Model):
+    """Outbox entry delivered by the send_queued_mail command"""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.TextField()
+    creation_date = models.DateTimeField(default=timezone.now)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Full-page cache of the pages anonymous readers get.
+
+The entry of a page (its path with the query string) records the generations it was rendered
+with (see hasker.generations). Once a write bumps one of them, or the entry is older than
+PAGE_CACHE_TTL (the trending block has no generation), the entry is stale: the first worker to
+notice takes a short lock and renders the page again, while the others keep serving the stale
+bytes for up to PAGE_CACHE_STALE_TTL more seconds instead of all rendering it at once.
+The entries, the generations and the lock coordinate the workers only if they share the cache
+backend, as the memcached one of config.settings.production does (checked by hasker.W001).
+
+Pages that used the CSRF token or set cookies are never stored, and the path is part of the
+key, so the login link's '?next=' always points back to the page it is on.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.encoding import force_bytes
+
+from . import generations
+
+
+PAGE_CACHE_KEY = 'hasker:page:{0}'
+PAGE_CACHE_LOCK_KEY = 'hasker:page:lock:{0}'
+PAGE_CACHE_TTL = 60
+PAGE_CACHE_STALE_TTL = 600
+PAGE_CACHE_LOCK_TTL = 30
+
+
+def anonymous_page_cache(get_generation_keys):
+    """
+    Caches the GET responses of the view for anonymous users. get_generation_keys(req, *args, **kwargs)
+    returns the generation keys of the data the page shows.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(req, *args, **kwargs):
+            user = getattr(req, 'user', None)
+            if req.method != 'GET' or (user is not None and user.is_authenticated):
+                return view(req, *args, **kwargs)
+            digest = hashlib.sha1(force_bytes(req.get_full_path())).hexdigest()
+            key = PAGE_CACHE_KEY.format(digest)
+            versions = generations.get_generations(get_generation_keys(req, *args, **kwargs))
+            entry = cache.get(key)
+            if entry is not None:
+                entry_versions, created, content, content_type = entry
+                if entry_versions == versions and created + PAGE_CACHE_TTL > time.time():
+                    return HttpResponse(content, content_type=content_type)
+                lock_key = PAGE_CACHE_LOCK_KEY.format(digest)
+                if not cache.add(lock_key, True, PAGE_CACHE_LOCK_TTL):
+                    return HttpResponse(content, content_type=content_type)
+                try:
+                    return _render(view, req, args, kwargs, key, versions)
+                finally:
+                    cache.delete(lock_key)
+            return _render(view, req, args, kwargs, key, versions)
+        return wrapper
+    return decorator
+
+
+def _render(view, req, args, kwargs, key, versions):
+    response = view(req, *args, **kwargs)
+    if isinstance(response, HttpResponse) and response.status_code == 200 and not response.cookies \
+            and not req.META.get('CSRF_COOKIE_USED'):
+        cache.set(key, (versions, time.time(), response.content, response['Content-Type']),
+                  PAGE_CACHE_TTL + PAGE_CACHE_STALE_TTL)
+    return response
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import base64
+import binascii
+import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_NEXT = 'n'
+_PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage(object):
+
+    def __init__(self, object_list, has_previous, has_next, previous_cursor, next_cursor):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+
+class KeysetPaginator(object):
+    """
+    Paginates a queryset by the values of the last/first row of a page instead of OFFSET,
+    so every page costs the same indexed range scan. All keys are sorted in the same direction
+    (descending by default), and the last key must be unique (normally 'id'). Keys that are not
+    model fields are treated as float annotations (e.g. a search rank).
+    """
+
+    def __init__(self, queryset, keys, per_page, descending=True):
+        self.queryset = queryset
+        self.keys = tuple(keys)
+        self.per_page = per_page
+        self.descending = descending
+        self._fields = [self._get_field(key) for key in self.keys]
+
+    def _get_field(self, key):
+        try:
+            return self.queryset.model._meta.get_field(key)
+        except FieldDoesNotExist:
+            field = models.FloatField()
+            field.set_attributes_from_name(key)
+            return field
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = list(self._ordered(forward=True)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return self._make_page(rows, False, has_next)
+        direction, values = self._decode(cursor)
+        if direction == _NEXT:
+            rows = list(self._ordered(forward=True).filter(self._after(values))[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return self._make_page(rows, True, has_next)
+        rows = list(self._ordered(forward=False).filter(self._before(values))[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._make_page(rows, has_previous, True)
+
+    def _ordered(self, forward):
+        prefix = '-' if forward == self.descending else ''
+        return self.queryset.order_by(*[prefix + key for key in self.keys])
+
+    def _after(self, values):
+        return self._compare(values, 'lt' if self.descending else 'gt')
+
+    def _before(self, values):
+        return self._compare(values, 'gt' if self.descending else 'lt')
+
+    def _compare(self, values, lookup):
+        # (k1, k2, k3) < (v1, v2, v3) expanded into an OR of prefixes; the redundant
+        # k1 <= v1 bound lets the database seek into the index instead of filtering a scan
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            term = Q(**{'{0}__{1}'.format(key, lookup): values[i]})
+            for prev_key, prev_value in zip(self.keys[:i], values[:i]):
+                term &= Q(**{prev_key: prev_value})
+            condition |= term
+        return Q(**{'{0}__{1}e'.format(self.keys[0], lookup): values[0]}) & condition
+
+    def _make_page(self, rows, has_previous, has_next):
+        previous_cursor = self._encode(_PREVIOUS, rows[0]) if rows and has_previous else None
+        next_cursor = self._encode(_NEXT, rows[-1]) if rows and has_next else None
+        return KeysetPage(rows, has_previous and bool(rows), has_next and bool(rows),
+                          previous_cursor, next_cursor)
+
+    def _encode(self, direction, obj):
+        parts = [direction]
+        for field in self._fields:
+            value = getattr(obj, field.attname)
+            if isinstance(field, models.DateTimeField):
+                delta = value - _EPOCH
+                value = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+            parts.append(repr(value) if isinstance(value, float) else str(value))
+        raw = ','.join(parts).encode('ascii')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def _decode(self, cursor):
+        try:
+            cursor = str(cursor)
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+            parts = raw.split(',')
+            direction, parts = parts[0], parts[1:]
+            if direction not in (_NEXT, _PREVIOUS) or len(parts) != len(self.keys):
+                raise InvalidCursor()
+            values = []
+            for field, part in zip(self._fields, parts):
+                if isinstance(field, models.DateTimeField):
+                    values.append(_EPOCH + datetime.timedelta(microseconds=int(part)))
+                else:
+                    values.append(field.to_python(part))
+        except (TypeError, ValueError, OverflowError, UnicodeError, binascii.Error, ValidationError):
+            raise InvalidCursor()
+        return direction, values
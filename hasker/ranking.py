@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Hot ranking of the questions.
+
+The score is the order of magnitude of the question's points (votes plus weighted answers)
+plus its age measured from a fixed epoch, so every HOT_DECAY_SECONDS of being newer outweighs
+ten times the points. Since the age part never changes, a score only needs recomputing when the
+points do, and an ORDER BY on the stored column ranks fresh questions above stale ones.
+"""
+import datetime
+import math
+
+from django.db import transaction
+from django.utils import timezone
+
+
+HOT_EPOCH = datetime.datetime(2017, 1, 1, tzinfo=timezone.utc)
+HOT_DECAY_SECONDS = 45000
+ANSWER_POINTS = 2
+BATCH_SIZE = 1000
+
+
+def hot_score(rating, answers_num, creation_date):
+    points = rating + ANSWER_POINTS * answers_num
+    order = math.log10(max(abs(points), 1))
+    sign = 1 if points > 0 else -1 if points < 0 else 0
+    age = creation_date - HOT_EPOCH
+    return sign * order + (age.days * 86400 + age.seconds) / float(HOT_DECAY_SECONDS)
+
+
+def refresh_hot_score(question_model, question_id):
+    """Recomputes the stored score of a question; run it in the transaction that changed its points"""
+    rows = question_model.objects.filter(pk=question_id)
+    rating, answers_num, creation_date = rows.values_list('rating', 'answers_num', 'creation_date').get()
+    score = hot_score(rating, answers_num, creation_date)
+    rows.update(hot_score=score)
+    return score
+
+
+def recompute_hot_scores(question_model, batch_size=BATCH_SIZE):
+    """Fixes the stored scores that differ from the computed ones in id batches and returns their number"""
+    last_id = 0
+    fixed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(question_model.objects.filter(id__gt=last_id).order_by('id').select_for_update()
+                        .values_list('id', 'rating', 'answers_num', 'creation_date', 'hot_score')[:batch_size])
+            if not rows:
+                break
+            for question_id, rating, answers_num, creation_date, stored in rows:
+                score = hot_score(rating, answers_num, creation_date)
+                if score != stored:
+                    question_model.objects.filter(id=question_id).update(hot_score=score)
+                    fixed += 1
+        last_id = rows[-1][0]
+    return fixed
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Full-text search over questions.
+
+PostgreSQL keeps a weighted tsvector (title 'A', text 'B') in Question.search_vector behind a GIN index.
+Other databases (SQLite test runs) use an inverted index of SearchTerm rows built here in Python
+with the same title/text weights.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+TITLE_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+RANK_SCALE = 10 ** 6
+
+SNIPPET_WORDS = 30
+
+_WORD_RE = re.compile(r'\w+', re.U)
+
+
+def tokenize(text):
+    return [word[:50] for word in _WORD_RE.findall(text.lower())]
+
+
+def index_question(question):
+    _get_backend().index(question)
+
+
+def search(queryset, query):
+    """Filters the queryset by the query and annotates every question with its 'rank'"""
+    return _get_backend().search(queryset, query)
+
+
+def highlight(text, query):
+    """Returns an escaped fragment of the text around the first match with the matched words in <mark>"""
+    terms = set(tokenize(query))
+    words = list(_WORD_RE.finditer(text))
+    first_match = next((i for i, word in enumerate(words) if word.group().lower() in terms), 0)
+    start = max(0, first_match - SNIPPET_WORDS // 3)
+    window = words[start:start + SNIPPET_WORDS]
+    if not window:
+        return mark_safe(u'')
+    parts = [u'… '] if start else []
+    pos = window[0].start() if start else 0
+    for word in window:
+        parts.append(escape(text[pos:word.start()]))
+        if word.group().lower() in terms:
+            parts.append(u'<mark>{0}</mark>'.format(escape(word.group())))
+        else:
+            parts.append(escape(word.group()))
+        pos = word.end()
+    if start + SNIPPET_WORDS < len(words):
+        parts.append(u' …')
+    else:
+        parts.append(escape(text[pos:]))
+    return mark_safe(u''.join(parts))
+
+
+def _get_backend():
+    if connection.vendor == 'postgresql':
+        return _PostgresBackend()
+    return _InvertedIndexBackend()
+
+
+class _PostgresBackend(object):
+
+    def index(self, question):
+        vector = SearchVector('title', weight='A') + SearchVector('text', weight='B')
+        rows = type(question).objects.filter(pk=question.pk)
+        rows.update(search_vector=vector)
+        question.search_vector = rows.values_list('search_vector', flat=True).get()
+
+    def search(self, queryset, query):
+        # the rank keys the keyset cursor, so it has to come back exactly as compared: floats are
+        # returned rounded to 15 digits, integers are not
+        search_query = SearchQuery(query)
+        rank = Cast(SearchRank(F('search_vector'), search_query), FloatField()) * Value(RANK_SCALE, FloatField())
+        return queryset.filter(search_vector=search_query).annotate(rank=Cast(rank, IntegerField()))
+
+
+class _InvertedIndexBackend(object):
+
+    def index(self, question):
+        from .models import SearchTerm
+        weights = {}
+        for term in tokenize(question.title):
+            weights[term] = TITLE_WEIGHT
+        for term in set(tokenize(question.text)):
+            weights[term] = weights.get(term, 0) + TEXT_WEIGHT
+        SearchTerm.objects.filter(question=question).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, question=question, weight=weight) for term, weight in weights.items())
+
+    def search(self, queryset, query):
+        from .models import SearchTerm
+        terms = set(tokenize(query))
+        matched = SearchTerm.objects.filter(term__in=terms).order_by().values('question')\
+            .annotate(matched=Count('id')).filter(matched=len(terms)).values('question')
+        rank = SearchTerm.objects.filter(term__in=terms, question=OuterRef('pk')).order_by().values('question')\
+            .annotate(rank=Sum('weight')).values('rank')
+        return queryset.filter(id__in=matched).annotate(rank=Subquery(rank, output_field=FloatField()))
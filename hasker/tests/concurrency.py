@@ -0,0 +1,70 @@
+import logging
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Sum
+from django.test import TransactionTestCase, skipUnlessDBFeature
+
+from hasker.models import Question, QuestionVote, AnswerVote
+
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+THREADS = 8
+VOTES_PER_THREAD = 50
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class TestConcurrentVoting(TransactionTestCase):
+    """
+    Stress benchmark: several threads cast, flip and withdraw votes on the same question and answer,
+    then the stored ratings must equal the sums of the vote rows.
+    """
+
+    def setUp(self):
+        super(TestConcurrentVoting, self).setUp()
+        author = User.objects.create(username='author', email='author@mail.ru', password='123')
+        self.voters = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                           password='123') for i in xrange(THREADS // 2)]
+        self.question = Question.objects.create('WTF?', 'LOL', author, [])
+        self.answer = self.question.answer_set.create(author=author, text='SPAM')
+
+    def _worker(self, seed, errors):
+        rnd = random.Random(seed)
+        try:
+            for _ in xrange(VOTES_PER_THREAD):
+                # two threads per voter, so the same (target, user) rows are contended
+                user = self.voters[seed % len(self.voters)]
+                target = rnd.choice((self.question, self.answer))
+                value = rnd.choice((QuestionVote.POSITIVE, QuestionVote.NEGATIVE))
+                target.vote(user, value)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_ratings_match_votes(self):
+        errors = []
+        threads = [threading.Thread(target=self._worker, args=(i, errors)) for i in xrange(THREADS)]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+        self.assertEqual(errors, [])
+
+        self.question.refresh_from_db()
+        self.answer.refresh_from_db()
+        question_votes = QuestionVote.objects.filter(question=self.question)
+        answer_votes = AnswerVote.objects.filter(answer=self.answer)
+        self.assertEqual(self.question.rating, question_votes.aggregate(s=Sum('value'))['s'] or 0)
+        self.assertEqual(self.answer.rating, answer_votes.aggregate(s=Sum('value'))['s'] or 0)
+        self.assertLessEqual(question_votes.count(), len(self.voters))
+        self.assertLessEqual(answer_votes.count(), len(self.voters))
+        logger.info('%d votes in %.2fs (%.0f votes/s)',
+                    THREADS * VOTES_PER_THREAD, elapsed, THREADS * VOTES_PER_THREAD / elapsed)
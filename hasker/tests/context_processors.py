@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+
+from hasker.checks import check_shared_cache
+from hasker.context_processors import trending
+from hasker.models import Question, QuestionVote
+from hasker.trending import TRENDING_CACHE_KEY, TRENDING_SIZE
+
+
+User = get_user_model()
+
+
+class TestTrending(TestCase):
+
+    def setUp(self):
+        super(TestTrending, self).setUp()
+        cache.clear()
+        self.req = RequestFactory().get('/')
+        self.alice = User.objects.create(username='alice', email='alice@mail.ru', password='123')
+        self.bob = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        for _ in xrange(TRENDING_SIZE + 5):
+            Question.objects.create('WTF?', 'LOL', self.bob, [])
+
+    def test_cached(self):
+        with self.assertNumQueries(1):
+            trending(self.req)
+        with self.assertNumQueries(0):
+            items = trending(self.req)['trending']
+        self.assertEqual(len(items), TRENDING_SIZE)
+        self.assertEqual(items[0].url(), Question.objects.get(id=items[0].id).url())
+
+    def test_vote_outside_the_list(self):
+        trending(self.req)
+        oldest = Question.objects.order_by('creation_date', 'id').first()
+        oldest.vote(self.alice, QuestionVote.POSITIVE)
+        items = trending(self.req)['trending']
+        self.assertEqual(items[0].id, oldest.id)
+        self.assertEqual(items[0].rating, 1)
+
+        old = Question.objects.order_by('creation_date', 'id')[1]
+        old.vote(self.alice, QuestionVote.NEGATIVE)
+        with self.assertNumQueries(0):
+            trending(self.req)
+
+        oldest.vote(self.alice, QuestionVote.POSITIVE)
+        items = trending(self.req)['trending']
+        self.assertNotIn(oldest.id, [item.id for item in items])
+
+    def test_shared_cache_check(self):
+        # the invalidations above only reach the other workers through a shared cache
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['hasker.W001'])
+        shared = {'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache', 'LOCATION': '127.0.0.1:11211'}
+        with override_settings(CACHES={'default': shared}):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class TestTrendingCommit(TransactionTestCase):
+
+    def test_dropped_on_commit(self):
+        cache.clear()
+        alice = User.objects.create(username='alice', email='alice@mail.ru', password='123')
+        bob = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        question = Question.objects.create('WTF?', 'LOL', bob, [])
+        trending(RequestFactory().get('/'))
+        with transaction.atomic():
+            question.vote(alice, QuestionVote.POSITIVE)
+            # a reader refills the block with the ranking from before the vote
+            cache.set(TRENDING_CACHE_KEY, [])
+        self.assertIsNone(cache.get(TRENDING_CACHE_KEY))
@@ -0,0 +1,70 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from hasker.export import export_questions
+from hasker.models import Question
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                          password='123', avatar='blank.png') for i in xrange(3)]
+        self.questions = [Question.objects.create(u'Question \u0436 {0}'.format(i), 'My Text', self.users[0],
+                                                  ['python', 'java']) for i in xrange(5)]
+        question = self.questions[1]
+        question.vote(self.users[1], 1)
+        question.vote(self.users[2], -1)
+        answer = question.answer_set.create(author=self.users[1], text='My Answer')
+        answer.vote(self.users[0], 1)
+        answer.mark_correct(self.users[0])
+
+    def test_export(self):
+        with self.assertNumQueries(1 + 4 * 3):
+            lines = list(export_questions(batch_size=2))
+        questions = [json.loads(line) for line in lines]
+        self.assertTrue(all(line.endswith(u'\n') for line in lines))
+        self.assertEqual([question['id'] for question in questions], [question.pk for question in self.questions])
+
+        question = questions[1]
+        self.assertEqual(question['title'], u'Question \u0436 1')
+        self.assertEqual(question['author'], 'user0')
+        self.assertEqual(question['tags'], ['java', 'python'])
+        self.assertEqual(question['votes'], {'up': 1, 'down': 1})
+        self.assertEqual(question['answers_num'], 1)
+        self.assertEqual(len(question['answers']), 1)
+        answer = question['answers'][0]
+        self.assertEqual((answer['author'], answer['is_correct'], answer['rating']), ('user1', True, 1))
+        self.assertEqual(answer['votes'], {'up': 1, 'down': 0})
+        self.assertEqual(questions[0]['answers'], [])
+        self.assertEqual(questions[0]['votes'], {'up': 0, 'down': 0})
+
+    def test_resume(self):
+        lines = list(export_questions(after_id=self.questions[2].pk))
+        self.assertEqual([json.loads(line)['id'] for line in lines], [question.pk for question in self.questions[3:]])
+
+    def test_command(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('export_dump', stdout=stdout, stderr=stderr)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 5)
+        self.assertIn('the last id is {0}'.format(self.questions[-1].pk), stderr.getvalue())
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'dump.ndjson.gz')
+            call_command('export_dump', output=path, batch_size=2, stderr=StringIO())
+            call_command('export_dump', output=path, after_id=self.questions[3].pk, stderr=StringIO())
+            with gzip.open(path, 'rb') as file_:
+                ids = [json.loads(line)['id'] for line in file_]
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(ids, [question.pk for question in self.questions] + [self.questions[4].pk])
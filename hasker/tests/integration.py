@@ -96,11 +96,11 @@ class TestAuthenticatedUser(TestCase):
 
         # answer the own question
         data = {'text': 'My answer'}
-        with mock.patch('hasker.views.send_mail') as send_mail:
+        with mock.patch('hasker.views.queue_mail') as queue_mail:
             url = reverse('question', kwargs={'slug': slugs[-1]})
             resp = self.client.post(url, data, HTTP_HOST='example.com')
-            send_mail.assert_called_once()
-            args, kwargs = send_mail.call_args
+            queue_mail.assert_called_once()
+            args, kwargs = queue_mail.call_args
             self.assertTrue(url in kwargs['html_message'])
             self.assertRedirects(resp, url)
 
@@ -0,0 +1,89 @@
+import datetime
+
+import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from hasker.mail import queue_mail, send_queued_mail, MAX_ATTEMPTS
+from hasker.models import OutgoingMail
+
+
+class TestMailQueue(TestCase):
+
+    def test_send(self):
+        for i in xrange(3):
+            queue_mail(u'Subject', u'Text', 'hasker@mail.ru', ['user{0}@mail.ru'.format(i)],
+                       html_message=u'<b>Text</b>')
+        self.assertEqual(len(mail.outbox), 0)
+
+        with mock.patch('hasker.mail.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(send_queued_mail(batch_size=2), 2)
+            get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].alternatives, [(u'<b>Text</b>', 'text/html')])
+
+        call_command('send_queued_mail', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['user0@mail.ru', 'user1@mail.ru', 'user2@mail.ru'])
+        self.assertFalse(OutgoingMail.objects.exists())
+
+    def test_retry(self):
+        queue_mail(u'Subject', u'Text', 'hasker@mail.ru', ['bob@mail.ru'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=IOError()):
+            send_queued_mail()
+        outgoing = OutgoingMail.objects.get()
+        self.assertEqual(outgoing.attempts, 1)
+        self.assertGreater(outgoing.next_attempt, timezone.now())
+        self.assertEqual(send_queued_mail(), 0)
+
+        OutgoingMail.objects.update(next_attempt=timezone.now() - datetime.timedelta(seconds=1))
+        send_queued_mail()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(OutgoingMail.objects.exists())
+
+    def test_claimed(self):
+        queue_mail(u'Subject', u'Text', 'hasker@mail.ru', ['bob@mail.ru'])
+        other_worker = []
+
+        def send_messages(messages):
+            # the message is being sent, so a concurrent run must not pick it up again
+            other_worker.append(send_queued_mail())
+            return len(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            self.assertEqual(send_queued_mail(), 1)
+        self.assertEqual(other_worker, [0])
+        self.assertFalse(OutgoingMail.objects.exists())
+
+    def test_crashed_worker(self):
+        queue_mail(u'Subject', u'Text', 'hasker@mail.ru', ['bob@mail.ru'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=SystemExit()):
+            with self.assertRaises(SystemExit):
+                send_queued_mail()
+        self.assertEqual(send_queued_mail(), 0)
+        OutgoingMail.objects.update(next_attempt=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(send_queued_mail(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_give_up(self):
+        queue_mail(u'Subject', u'Text', 'hasker@mail.ru', ['bob@mail.ru'])
+        OutgoingMail.objects.update(attempts=MAX_ATTEMPTS - 1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=IOError()):
+            with mock.patch('hasker.mail.logger') as logger:
+                self.assertEqual(send_queued_mail(), 1)
+        self.assertEqual(logger.error.call_count, 1)
+        self.assertFalse(OutgoingMail.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_purge_exhausted(self):
+        queue_mail(u'Subject', u'Text', 'hasker@mail.ru', ['bob@mail.ru'])
+        OutgoingMail.objects.update(attempts=MAX_ATTEMPTS)
+        with mock.patch('hasker.mail.logger') as logger:
+            self.assertEqual(send_queued_mail(), 0)
+        self.assertEqual(logger.error.call_count, 1)
+        self.assertFalse(OutgoingMail.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
@@ -1,10 +1,23 @@
+import datetime
+import logging
+import time
+
+import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.six import StringIO
 
-from hasker.models import Tag, QuestionVote, AnswerVote
+from hasker import ranking
+from hasker.models import Question, Tag, QuestionVote, AnswerVote
 
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 class TestQuestion(TestCase):
@@ -16,12 +29,171 @@ class TestQuestion(TestCase):
         question2 = user.question_set.create(title=title, text='T', tag_names=[])
         self.assertNotEqual(question1.slug, question2.slug)
 
+    def test_slug_allocation(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        Question.objects.bulk_create([
+            Question(title='T', text='T', author=user, slug=slug)
+            for slug in ('how-to-sort', 'how-to-sort-2', 'how-to-sort-10', 'how-to-sort-dicts', 'how-to-sort-9x')])
+        question = Question(title='How to sort?', text='T', author=user)
+        with self.assertNumQueries(1):
+            self.assertEqual(question._get_unique_slug(), 'how-to-sort-11')
+
+        question = Question(title='How to sort dicts', text='T', author=user)
+        self.assertEqual(question._get_unique_slug(), 'how-to-sort-dicts-1')
+        question = Question(title='How to sort lists', text='T', author=user)
+        self.assertEqual(question._get_unique_slug(), 'how-to-sort-lists')
+
+        long_title = 'a' * 255
+        first = user.question_set.create(title=long_title, text='T', tag_names=[])
+        second = user.question_set.create(title=long_title, text='T', tag_names=[])
+        self.assertEqual(first.slug, 'a' * 255)
+        self.assertEqual(second.slug, 'a' * 244 + '-1')
+
+    def test_slug_long_suffix(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        stem = 'a' * 244 + '-'
+        user.question_set.create(title=stem + '9' * 10, text='T', tag_names=[])
+        user.question_set.create(title=stem + '999999999', text='T', tag_names=[])
+        question = Question(title=stem, text='T', author=user)
+        slug = question._get_unique_slug()
+        self.assertEqual(slug, stem + '1000000000')
+        self.assertLessEqual(len(slug), 255)
+
+    def test_save_keeps_counters(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        voter = User.objects.create(username='alice', email='alice@mail.ru', password='123')
+        question = user.question_set.create(title='Q?', text='T', tag_names=[])
+        stale = Question.objects.get(pk=question.pk)
+        question.answer_set.create(author=voter, text='A')
+        question.vote(voter, QuestionVote.POSITIVE)
+        stale.text = 'Edited'
+        stale.save()
+        question.refresh_from_db()
+        self.assertEqual((question.text, question.rating, question.answers_num), ('Edited', 1, 1))
+
+    def test_slug_conflict_retry(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        user.question_set.create(title='title', text='T', tag_names=[])
+        # simulate a concurrent insert that took the allocated slug
+        with mock.patch.object(Question, '_get_unique_slug', side_effect=['title', 'title-1']):
+            question = user.question_set.create(title='title', text='T', tag_names=[])
+        self.assertEqual(question.slug, 'title-1')
+
     def test_creation_tags(self):
         user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
         Tag(name='tag1').save()
         user.question_set.create(title='Q?', text='T', tag_names=['tag1', 'tag2'])
         self.assertEqual(Tag.objects.count(), 2)
 
+    def test_creation_tags_queries(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        Tag(name='tag1').save()
+        with CaptureQueriesContext(connection) as one_tag:
+            Question.objects.create('Q?', 'T', user, ['tag2'])
+        with CaptureQueriesContext(connection) as three_tags:
+            question = Question.objects.create('Q?', 'T', user, ['tag1', 'tag3', 'tag4', 'tag3'])
+        self.assertEqual(len(one_tag), len(three_tags))
+        self.assertEqual(sorted(tag.name for tag in question.tags.all()), ['tag1', 'tag3', 'tag4'])
+
+    def test_get_or_create_all_conflict(self):
+        Tag(name='tag1').save()
+        Tag(name='tag2').save()
+        # simulate a concurrent request that has created 'tag2' after the lookup
+        real_filter = Tag.objects.filter
+        lookups = []
+
+        def filter_(**kwargs):
+            lookups.append(kwargs)
+            tags = real_filter(**kwargs)
+            return tags.exclude(name='tag2') if len(lookups) == 1 else tags
+
+        with mock.patch.object(Tag.objects, 'filter', side_effect=filter_):
+            tags = Tag.objects.get_or_create_all(['tag1', 'tag2', 'tag3'])
+        self.assertEqual([tag.name for tag in tags], ['tag1', 'tag2', 'tag3'])
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_answers_num(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        question = user.question_set.create(title='Q?', text='T', tag_names=[])
+        a1 = question.answer_set.create(author=user, text='T')
+        question.answer_set.create(author=user, text='T')
+        question.refresh_from_db()
+        self.assertEqual(question.answers_num, 2)
+
+        a1.text = 'TT'
+        a1.save()
+        question.refresh_from_db()
+        self.assertEqual(question.answers_num, 2)
+
+        a1.delete()
+        question.refresh_from_db()
+        self.assertEqual(question.answers_num, 1)
+
+    def test_reconcile_answers_num(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        q1 = user.question_set.create(title='Q?', text='T', tag_names=[])
+        q2 = user.question_set.create(title='Q?', text='T', tag_names=[])
+        q1.answer_set.create(author=user, text='T')
+        Question.objects.update(answers_num=5)
+
+        call_command('reconcile_answers_num', batch_size=1, stdout=StringIO())
+        q1.refresh_from_db()
+        q2.refresh_from_db()
+        self.assertEqual(q1.answers_num, 1)
+        self.assertEqual(q2.answers_num, 0)
+
+    def test_hot_score(self):
+        alice = User.objects.create(username='alice', email='alice@mail.ru', password='123')
+        bob = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        now = timezone.now()
+        old = Question.objects.create('Q?', 'T', bob, [])
+        Question.objects.filter(pk=old.pk).update(creation_date=now - datetime.timedelta(days=30))
+        new = Question.objects.create('Q?', 'T', bob, [])
+        self.assertEqual(new.hot_score, ranking.hot_score(0, 0, new.creation_date))
+
+        old.refresh_from_db()
+        old.vote(alice, QuestionVote.POSITIVE)
+        old.answer_set.create(author=alice, text='T')
+        old.refresh_from_db()
+        self.assertEqual(old.hot_score, ranking.hot_score(1, 1, old.creation_date))
+        # a month-old question with a few points stays below a new one
+        self.assertEqual(list(Question.objects.order_by('-hot_score').values_list('id', flat=True)), [new.pk, old.pk])
+
+        new.vote(alice, QuestionVote.NEGATIVE)
+        new.refresh_from_db()
+        self.assertEqual(new.hot_score, ranking.hot_score(-1, 0, new.creation_date))
+
+    def test_recompute_hot(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        questions = [user.question_set.create(title='Q?', text='T', tag_names=[]) for _ in xrange(3)]
+        questions[0].answer_set.create(author=user, text='T')
+        expected = list(Question.objects.order_by('id').values_list('hot_score', flat=True))
+        Question.objects.filter(pk__in=[questions[0].pk, questions[2].pk]).update(hot_score=0)
+
+        stdout = StringIO()
+        call_command('recompute_hot', batch_size=2, stdout=stdout)
+        self.assertEqual(list(Question.objects.order_by('id').values_list('hot_score', flat=True)), expected)
+        self.assertIn('Fixed 2 question(s)', stdout.getvalue())
+
+
+class TestSlugBenchmark(TestCase):
+
+    SAME_TITLE_QUESTIONS = 2000
+
+    def test_same_titles(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        started = time.time()
+        for _ in xrange(self.SAME_TITLE_QUESTIONS):
+            Question(title='How to sort a list', text='T', author=user).save()
+        elapsed = time.time() - started
+        self.assertEqual(Question.objects.filter(slug__startswith='how-to-sort-a-list').count(),
+                         self.SAME_TITLE_QUESTIONS)
+        question = Question(title='How to sort a list', text='T', author=user)
+        with self.assertNumQueries(1):
+            slug = question._get_unique_slug()
+        self.assertEqual(slug, 'how-to-sort-a-list-{0:d}'.format(self.SAME_TITLE_QUESTIONS))
+        logger.info('%d same-titled questions in %.2fs', self.SAME_TITLE_QUESTIONS, elapsed)
+
 
 class TestUser(TestCase):
 
@@ -33,18 +205,23 @@ class TestUser(TestCase):
         self.assertFalse(a1.is_correct)
         self.assertFalse(a2.is_correct)
 
-        a1.mark_correct(user)
-        a1.refresh_from_db()
-        a2.refresh_from_db()
+        with self.assertNumQueries(1):
+            a1.mark_correct(user)
+        question.refresh_from_db()
+        self.assertEqual(question.accepted_answer_id, a1.id)
         self.assertTrue(a1.is_correct)
         self.assertFalse(a2.is_correct)
 
         a2.mark_correct(user)
-        a1.refresh_from_db()
-        a2.refresh_from_db()
+        question.refresh_from_db()
         self.assertFalse(a1.is_correct)
         self.assertTrue(a2.is_correct)
 
+        other = User.objects.create(username='alice', email='alice@mail.ru', password='123')
+        self.assertRaises(ValueError, lambda: a1.mark_correct(other))
+        question.refresh_from_db()
+        self.assertEqual(question.accepted_answer_id, a2.id)
+
     def test_vote_for_question(self):
         alice = User.objects.create(username='alice', email='alice@mail.ru', password='123')
         bob = User.objects.create(username='bob', email='bob@mail.ru', password='123')
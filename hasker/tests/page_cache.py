@@ -0,0 +1,90 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+
+from hasker import generations
+from hasker.models import Question
+from hasker.page_cache import anonymous_page_cache, PAGE_CACHE_LOCK_KEY
+
+
+class TestAnonymousPageCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create(username='bob', email='bob@mail.ru', avatar='blank.png')
+        self.user.set_password('123')
+        self.user.save()
+        self.question = Question.objects.create('WTF?', 'LOL', self.user, ['python'])
+
+    def test_cached(self):
+        for url in (reverse('new'), reverse('hot'), reverse('tag', kwargs={'name': 'python'}), self.question.url()):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).content, resp.content)
+
+    def test_invalidated(self):
+        self.client.get(reverse('new'))
+        self.client.get(self.question.url())
+        self.question.answer_set.create(author=self.user, text='SPAM')
+        self.assertContains(self.client.get(self.question.url()), 'SPAM')
+        self.assertContains(self.client.get(reverse('new')), '<div>1</div>')
+
+        Question.objects.create('New question', 'LOL', self.user, [])
+        self.assertContains(self.client.get(reverse('new')), 'New question')
+
+    def test_stale_while_revalidate(self):
+        url = self.question.url()
+        self.client.get(url)
+        self.question.answer_set.create(author=self.user, text='SPAM')
+        # another worker is rendering the page, the stale one is served meanwhile
+        lock_key = self._get_lock_key(url)
+        cache.add(lock_key, True)
+        with self.assertNumQueries(0):
+            self.assertNotContains(self.client.get(url), 'SPAM')
+        cache.delete(lock_key)
+        self.assertContains(self.client.get(url), 'SPAM')
+        self.assertIsNone(cache.get(lock_key))
+
+    def test_authenticated(self):
+        url = self.question.url()
+        self.client.get(url)
+        self.client.login(username='bob', password='123')
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Logout')
+        self.assertContains(resp, 'csrfmiddlewaretoken')
+        self.client.logout()
+        resp = self.client.get(url)
+        self.assertNotContains(resp, 'Logout')
+        self.assertContains(resp, '?next={0}"'.format(url))
+
+    def test_error_not_cached(self):
+        self.question.answer_set.create(author=self.user, text='SPAM')
+        self.assertContains(self.client.get(self.question.url()), 'SPAM')
+        resp = self.client.get(self.question.url() + '?cursor=zzz')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_csrf_token_not_cached(self):
+        calls = []
+
+        @anonymous_page_cache(lambda req: [generations.QUESTIONS_KEY])
+        def view(req):
+            calls.append(req)
+            return HttpResponse(get_token(req))
+
+        for _ in xrange(2):
+            req = RequestFactory().get('/csrf')
+            req.user = AnonymousUser()
+            view(req)
+        self.assertEqual(len(calls), 2)
+
+    @staticmethod
+    def _get_lock_key(url):
+        return PAGE_CACHE_LOCK_KEY.format(hashlib.sha1(url.encode('utf-8')).hexdigest())
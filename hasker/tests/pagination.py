@@ -0,0 +1,54 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from hasker.models import Question
+from hasker.pagination import KeysetPaginator, InvalidCursor
+
+
+User = get_user_model()
+
+
+class TestKeysetPaginator(TestCase):
+
+    def setUp(self):
+        super(TestKeysetPaginator, self).setUp()
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        now = timezone.now()
+        for i in xrange(25):
+            question = Question.objects.create('WTF?', 'LOL', user, [])
+            # duplicated ratings and dates to exercise the tie-breaking keys
+            question.rating = i % 3
+            question.creation_date = now - datetime.timedelta(seconds=i % 4)
+            question.save(update_fields=['rating', 'creation_date'])
+        self.expected = list(Question.objects.order_by('-rating', '-creation_date', '-id'))
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(Question.objects.all(), ('rating', 'creation_date', 'id'), 7)
+        pages = [paginator.page()]
+        self.assertFalse(pages[0].has_previous())
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([q for page in pages for q in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 4])
+
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(paginator.page(back[-1].previous_cursor))
+        self.assertEqual([list(page) for page in reversed(back)], [list(page) for page in pages])
+        self.assertFalse(back[-1].has_previous())
+
+    def test_ascending(self):
+        paginator = KeysetPaginator(Question.objects.all(), ('rating', 'creation_date', 'id'), 10, descending=False)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(list(first) + list(second) + list(third), self.expected[::-1])
+        self.assertEqual(list(paginator.page(third.previous_cursor)), list(second))
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Question.objects.all(), ('creation_date', 'id'), 7)
+        for cursor in ('zzz', 'bjEsMg', u'\u0436', 'eCwxLDI'):
+            self.assertRaises(InvalidCursor, lambda: paginator.page(cursor))
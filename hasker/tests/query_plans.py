@@ -0,0 +1,110 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from hasker.models import Question, Tag, QuestionVote, AnswerVote
+from hasker.pagination import KeysetPaginator
+
+
+User = get_user_model()
+
+
+class TestQueryPlans(TestCase):
+    """
+    Runs EXPLAIN for the queries behind the listings, the question page and voting
+    and fails if any of them scans a whole table or does not read through the index meant for it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username='user{0}'.format(i), email='user{0}@mail.ru'.format(i),
+                                         password='123') for i in xrange(3)]
+        for i in xrange(60):
+            author = cls.users[i % 3]
+            question = Question.objects.create('Question {0}'.format(i), 'Text', author, ['tag{0}'.format(i % 4)])
+            for j in xrange(3):
+                question.answer_set.create(author=cls.users[j], text='Answer')
+            question.vote(cls.users[(i + 1) % 3], QuestionVote.POSITIVE)
+        cls.question = Question.objects.order_by('id').first()
+        cls.user = cls.users[1]
+
+    def setUp(self):
+        super(TestQueryPlans, self).setUp()
+        if connection.vendor == 'postgresql':
+            # the seeded tables are tiny, so make the planner read through the indexes the way it
+            # would on big ones: no full scans, no bitmap scans losing the index order, no sorts
+            with connection.cursor() as cursor:
+                for setting in ('enable_seqscan', 'enable_bitmapscan', 'enable_sort'):
+                    cursor.execute('SET LOCAL {0} = off'.format(setting))
+
+    def _explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+
+    def _indexes(self, model, *columns):
+        """Returns the names of the indexes starting with the columns"""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return [name for name, info in constraints.items()
+                if (info['index'] or info['unique']) and info['columns'][:len(columns)] == list(columns)]
+
+    def assertUsesIndex(self, queryset, *indexes):
+        """Fails unless the plan reads through one of the named indexes"""
+        plan = self._explain(queryset)
+        text = '\n'.join(plan)
+        if connection.vendor == 'sqlite':
+            full_scan = re.search(r'\bSCAN (TABLE )?\w+(?! USING)( |$)', text, re.M)
+        else:
+            full_scan = 'Seq Scan' in text
+        self.assertFalse(full_scan, 'Full table scan:\n' + text)
+        self.assertTrue(any(re.search(r'\b{0}\b'.format(re.escape(name)), text) for name in indexes),
+                        'None of {0} used:\n{1}'.format(', '.join(indexes), text))
+
+    def _keyset_querysets(self, queryset, keys):
+        paginator = KeysetPaginator(queryset, keys, 5)
+        first = paginator._ordered(forward=True)[:6]
+        cursor_values = paginator._decode(paginator.page().next_cursor)[1]
+        after = paginator._ordered(forward=True).filter(paginator._after(cursor_values))[:6]
+        before = paginator._ordered(forward=False).filter(paginator._before(cursor_values))[:6]
+        return first, after, before
+
+    def test_new_listing(self):
+        for queryset in self._keyset_querysets(Question.objects.all(), ('creation_date', 'id')):
+            self.assertUsesIndex(queryset, 'question_new_idx')
+
+    def test_hot_listing(self):
+        for queryset in self._keyset_querysets(Question.objects.all(), ('hot_score', 'id')):
+            self.assertUsesIndex(queryset, 'question_hot_score_idx')
+
+    def test_trending(self):
+        for queryset in self._keyset_querysets(Question.objects.all(), ('rating', 'creation_date', 'id')):
+            self.assertUsesIndex(queryset, 'question_hot_idx')
+
+    def test_tag_listing(self):
+        tag = Tag.objects.get(name='tag1')
+        through = Question.tags.through
+        self.assertUsesIndex(Tag.objects.filter(name='tag1'), *self._indexes(Tag, 'name'))
+        for queryset in self._keyset_querysets(tag.question_set.all(), ('rating', 'creation_date', 'id')):
+            self.assertUsesIndex(queryset, 'question_hot_idx', *self._indexes(through, 'tag_id'))
+        self.assertUsesIndex(through.objects.filter(question_id__in=[1, 2, 3]), *self._indexes(through, 'question_id'))
+
+    def test_question_page(self):
+        self.assertUsesIndex(Question.objects.filter(slug=self.question.slug), *self._indexes(Question, 'slug'))
+        self.assertUsesIndex(self.question.answer_set.all()[:30], 'answer_question_order_idx')
+        self.assertUsesIndex(QuestionVote.objects.filter(question=self.question, user=self.user),
+                             *self._indexes(QuestionVote, 'question_id', 'user_id'))
+        answer_ids = list(self.question.answer_set.values_list('id', flat=True))
+        self.assertUsesIndex(AnswerVote.objects.filter(answer__in=answer_ids, user=self.user),
+                             *self._indexes(AnswerVote, 'answer_id'))
+
+    def test_votes(self):
+        answer = self.question.answer_set.first()
+        self.assertUsesIndex(QuestionVote.objects.filter(question=self.question, user=self.user),
+                             *self._indexes(QuestionVote, 'question_id', 'user_id'))
+        self.assertUsesIndex(AnswerVote.objects.filter(answer=answer, user=self.user),
+                             *self._indexes(AnswerVote, 'answer_id', 'user_id'))
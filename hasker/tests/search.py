@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from hasker import search
+from hasker.models import Question
+from hasker.pagination import KeysetPaginator
+
+
+User = get_user_model()
+
+
+class TestSearch(TestCase):
+
+    def setUp(self):
+        super(TestSearch, self).setUp()
+        self.user = User.objects.create(username='bob', email='bob@mail.ru', password='123')
+        self.in_title = Question.objects.create('How to sort a list', 'Nothing else', self.user, [])
+        self.in_text = Question.objects.create('Lists', 'I want to sort a list of tuples', self.user, [])
+        self.other = Question.objects.create('Dicts', 'How to merge two dicts', self.user, [])
+
+    def _search(self, query):
+        return list(search.search(Question.objects.all(), query).order_by('-rank', '-id'))
+
+    def test_ranking(self):
+        self.assertEqual(self._search('sort list'), [self.in_title, self.in_text])
+        self.assertEqual(self._search('dicts'), [self.other])
+        self.assertEqual(self._search('sort dicts'), [])
+        self.assertEqual(self._search('???'), [])
+
+    def test_reindex_on_change(self):
+        self.other.title = 'Sorting'
+        self.other.text = 'sort list'
+        self.other.save()
+        self.assertEqual(self._search('sort list'), [self.in_title, self.other, self.in_text])
+        self.assertEqual(self._search('dicts'), [])
+
+    def test_save_keeps_vector(self):
+        rows = Question.objects.filter(pk=self.other.pk)
+        rows.update(search_vector='dicts')
+        vector = rows.values_list('search_vector', flat=True).get()
+        self.other.rating = 1
+        self.other.save()
+        self.assertEqual(rows.values_list('search_vector', flat=True).get(), vector)
+
+    def test_paging_tied_ranks(self):
+        for _ in xrange(5):
+            Question.objects.create('Sort', 'A list', self.user, [])
+        paginator = KeysetPaginator(search.search(Question.objects.all(), 'sort list'), ('rank', 'id'), 2)
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self._search('sort list'))
+        self.assertEqual(len(seen), 7)
+
+    def test_highlight(self):
+        snippet = search.highlight(u'<b>Sort</b> a list of tuples', 'sort')
+        self.assertEqual(snippet, u'&lt;b&gt;<mark>Sort</mark>&lt;/b&gt; a list of tuples')
+
+        text = u' '.join(u'word{0}'.format(i) for i in xrange(100))
+        snippet = search.highlight(text, 'word50')
+        self.assertTrue(snippet.startswith(u'… word40 '))
+        self.assertIn(u'<mark>word50</mark>', snippet)
+        self.assertTrue(snippet.endswith(u'word69 …'))
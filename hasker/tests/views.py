@@ -1,10 +1,15 @@
+import re
+
 from django.test import TestCase, RequestFactory
 from django.urls import reverse
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth import get_user_model
 from django.shortcuts import Http404
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from hasker.models import Question, Tag
+from hasker.trending import refresh_trending
 from hasker.views import (
     new_view, hot_view, question_view, tag_view, search_view)
 
@@ -12,6 +17,11 @@ from hasker.views import (
 User = get_user_model()
 
 
+def _get_cursor(resp, label):
+    match = re.search(r'cursor=([\w-]+)"><span>[^<]*{0}'.format(label), resp.content.decode('utf-8'))
+    return match and match.group(1)
+
+
 class TestNewView(TestCase):
 
     def setUp(self):
@@ -26,19 +36,34 @@ class TestNewView(TestCase):
         resp = new_view(req)
         self.assertEqual(resp.status_code, 200)
 
-        req = self.factory.get(reverse('new')+'?page=2')
+        cursor = _get_cursor(new_view(req), 'Next')
+        req = self.factory.get(reverse('new')+'?cursor='+cursor)
         resp = new_view(req)
         self.assertEqual(resp.status_code, 200)
 
+    def test_invalid_cursor(self):
+        req = self.factory.get(reverse('new')+'?cursor=zzz')
+        self.assertRaises(Http404, lambda: new_view(req))
+
     def test_next_page_url(self):
         req = self.factory.get(reverse('new'))
         resp = new_view(req)
-        self.assertContains(resp, reverse('new')+'?page=2')
+        self.assertContains(resp, reverse('new')+'?cursor=')
+        self.assertIsNotNone(_get_cursor(resp, 'Next'))
+        self.assertIsNone(_get_cursor(resp, 'Previous'))
 
     def test_prev_page_url(self):
-        req = self.factory.get(reverse('new')+'?page=2')
+        cursor = _get_cursor(new_view(self.factory.get(reverse('new'))), 'Next')
+        req = self.factory.get(reverse('new')+'?cursor='+cursor)
         resp = new_view(req)
-        self.assertContains(resp, reverse('new')+'?page=1')
+        self.assertIsNone(_get_cursor(resp, 'Next'))
+        cursor = _get_cursor(resp, 'Previous')
+        self.assertIsNotNone(cursor)
+
+        req = self.factory.get(reverse('new')+'?cursor='+cursor)
+        resp = new_view(req)
+        self.assertEqual(len(re.findall('class="dt"', resp.content.decode('utf-8'))), 20)
+        self.assertIsNone(_get_cursor(resp, 'Previous'))
 
     def test_hot_url(self):
         req = self.factory.get(reverse('new'))
@@ -60,19 +85,34 @@ class TestHotView(TestCase):
         resp = hot_view(req)
         self.assertEqual(resp.status_code, 200)
 
-        req = self.factory.get(reverse('hot')+'?page=2')
+        cursor = _get_cursor(hot_view(req), 'Next')
+        req = self.factory.get(reverse('hot')+'?cursor='+cursor)
         resp = hot_view(req)
         self.assertEqual(resp.status_code, 200)
 
+    def test_invalid_cursor(self):
+        req = self.factory.get(reverse('hot')+'?cursor=zzz')
+        self.assertRaises(Http404, lambda: hot_view(req))
+
     def test_next_page_url(self):
         req = self.factory.get(reverse('hot'))
         resp = hot_view(req)
-        self.assertContains(resp, reverse('hot')+'?page=2')
+        self.assertContains(resp, reverse('hot')+'?cursor=')
+        self.assertIsNotNone(_get_cursor(resp, 'Next'))
+        self.assertIsNone(_get_cursor(resp, 'Previous'))
 
     def test_prev_page_url(self):
-        req = self.factory.get(reverse('hot')+'?page=2')
+        cursor = _get_cursor(hot_view(self.factory.get(reverse('hot'))), 'Next')
+        req = self.factory.get(reverse('hot')+'?cursor='+cursor)
         resp = hot_view(req)
-        self.assertContains(resp, reverse('hot')+'?page=1')
+        self.assertIsNone(_get_cursor(resp, 'Next'))
+        cursor = _get_cursor(resp, 'Previous')
+        self.assertIsNotNone(cursor)
+
+        req = self.factory.get(reverse('hot')+'?cursor='+cursor)
+        resp = hot_view(req)
+        self.assertEqual(len(re.findall('class="dt"', resp.content.decode('utf-8'))), 20)
+        self.assertIsNone(_get_cursor(resp, 'Previous'))
 
     def test_new_url(self):
         req = self.factory.get(reverse('hot'))
@@ -80,25 +120,41 @@ class TestHotView(TestCase):
         self.assertContains(resp, reverse('new'))
 
 
+class TestAskView(TestCase):
+
+    def test_constant_queries(self):
+        user = User.objects.create(username='bob', email='bob@mail.ru', password='123', avatar='blank.png')
+        self.client.force_login(user)
+        counts = []
+        for tags in ('one', 'two,three,four'):
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.post(reverse('ask'), {'title': 'WTF?', 'text': 'LOL', 'tags': tags})
+            self.assertEqual(resp.status_code, 302)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
 class TestQuestionView(TestCase):
 
     def setUp(self):
         super(TestQuestionView, self).setUp()
         self.factory = RequestFactory()
-        user = User.objects.create(username='bob', email='bob@mail.ru', password='123', avatar='blank.png')
-        self.question = Question.objects.create('WTF?', 'LOL', user, [])
+        self.user = User.objects.create(username='bob', email='bob@mail.ru', password='123', avatar='blank.png')
+        self.question = Question.objects.create('WTF?', 'LOL', self.user, [])
         for _ in xrange(31):
-            self.question.answer_set.create(author=user, text='SPAM')
+            self.question.answer_set.create(author=self.user, text='SPAM')
+
+    def _get(self, cursor=None, user=None):
+        url = reverse('question', kwargs={'slug': self.question.slug})
+        req = self.factory.get(url + '?cursor=' + cursor if cursor else url)
+        req.user = user or AnonymousUser()
+        return question_view(req, self.question.slug)
 
     def test_status_ok(self):
-        req = self.factory.get(reverse('question', kwargs={'slug': self.question.slug}))
-        req.user = AnonymousUser()
-        resp = question_view(req, self.question.slug)
+        resp = self._get()
         self.assertEqual(resp.status_code, 200)
 
-        req = self.factory.get(reverse('question', kwargs={'slug': self.question.slug})+'?page=2')
-        req.user = AnonymousUser()
-        resp = question_view(req, self.question.slug)
+        resp = self._get(_get_cursor(resp, 'Next'))
         self.assertEqual(resp.status_code, 200)
 
     def test_status_404(self):
@@ -107,17 +163,76 @@ class TestQuestionView(TestCase):
         req.user = AnonymousUser()
         self.assertRaises(Http404, lambda: question_view(req, slug))
 
+    def test_invalid_cursor(self):
+        self.assertRaises(Http404, lambda: self._get('zzz'))
+
     def test_next_page_url(self):
-        req = self.factory.get(reverse('question', kwargs={'slug': self.question.slug}))
-        req.user = AnonymousUser()
-        resp = question_view(req, self.question.slug)
-        self.assertContains(resp, reverse('question', kwargs={'slug': self.question.slug})+'?page=2')
+        resp = self._get()
+        self.assertContains(resp, reverse('question', kwargs={'slug': self.question.slug})+'?cursor=')
+        self.assertIsNotNone(_get_cursor(resp, 'Next'))
+        self.assertIsNone(_get_cursor(resp, 'Previous'))
 
     def test_prev_page_url(self):
-        req = self.factory.get(reverse('question', kwargs={'slug': self.question.slug})+'?page=2')
-        req.user = AnonymousUser()
-        resp = question_view(req, self.question.slug)
-        self.assertContains(resp, reverse('question', kwargs={'slug': self.question.slug})+'?page=1')
+        resp = self._get(_get_cursor(self._get(), 'Next'))
+        self.assertIsNone(_get_cursor(resp, 'Next'))
+        self.assertIsNotNone(_get_cursor(resp, 'Previous'))
+
+    def test_question_queries(self):
+        voter = User.objects.create(username='alice', email='alice@mail.ru', password='123', avatar='blank.png')
+        self.question.vote(voter, 1)
+        self.question.tags.add(Tag.objects.create(name='python'))
+        with self.assertNumQueries(2):
+            question = Question.objects.get(voter, slug=self.question.slug)
+            self.assertEqual((question.author.username, question.vote), ('bob', 1))
+            self.assertEqual([tag.name for tag in question.tags.all()], ['python'])
+        with self.assertNumQueries(2):
+            question = Question.objects.get(self.user, slug=self.question.slug)
+            self.assertIsNone(question.vote)
+            self.assertEqual(len(question.tags.all()), 1)
+        with self.assertNumQueries(2):
+            self.assertIsNone(Question.objects.get(slug=self.question.slug).vote)
+
+        # the question (with its author and the vote), its tags, the answers and the votes on them
+        refresh_trending()
+        req = self.factory.get(reverse('question', kwargs={'slug': self.question.slug}))
+        req.user = voter
+        with self.assertNumQueries(4):
+            question_view(req, self.question.slug)
+
+    def test_accepted_answer_first(self):
+        self.question.answer_set.create(author=self.user, text='SPAM')
+        accepted = self.question.answer_set.order_by('rating', 'creation_date', 'id').first()
+        accepted.mark_correct(self.user)
+        resp = self._get()
+        ids = [int(id_) for id_ in re.findall(r'class="answer" data-id="(\d+)"', resp.content.decode('utf-8'))]
+        self.assertEqual((ids[0], len(ids)), (accepted.id, 31))
+        self.assertContains(resp, 'status correct', count=1)
+        resp = self._get(_get_cursor(resp, 'Next'))
+        self.assertNotContains(resp, 'class="answer" data-id="{0}"'.format(accepted.id))
+
+        resp = new_view(self.factory.get(reverse('new')))
+        self.assertContains(resp, 'class="counter accepted"', count=1)
+
+    def test_all_answers_reachable(self):
+        user = User.objects.create(username='alice', email='alice@mail.ru', password='123', avatar='blank.png')
+        for _ in xrange(150):
+            self.question.answer_set.create(author=self.user, text='SPAM')
+        last = self.question.answer_set.order_by('rating', 'creation_date', 'id').first()
+        last.vote(user, -1)
+        ids = []
+        cursor = None
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                resp = self._get(cursor, user)
+            ids.extend(int(id_) for id_ in re.findall(r'class="answer" data-id="(\d+)"', resp.content.decode('utf-8')))
+            cursor = _get_cursor(resp, 'Next')
+            if cursor is None:
+                break
+            self.assertLess(len(queries), 10)
+        self.assertEqual(ids, list(self.question.answer_set.order_by('-rating', '-creation_date', '-id')
+                                   .values_list('id', flat=True)))
+        self.assertEqual(ids[-1], last.id)
+        self.assertIn('vote-against on', resp.content.decode('utf-8'))
 
 
 class TestTagView(TestCase):
@@ -135,7 +250,8 @@ class TestTagView(TestCase):
         resp = tag_view(req, self.tag.name)
         self.assertEqual(resp.status_code, 200)
 
-        req = self.factory.get(reverse('tag', kwargs={'name': self.tag.name})+'?page=2')
+        cursor = _get_cursor(tag_view(req, self.tag.name), 'Next')
+        req = self.factory.get(reverse('tag', kwargs={'name': self.tag.name})+'?cursor='+cursor)
         resp = tag_view(req, self.tag.name)
         self.assertEqual(resp.status_code, 200)
 
@@ -147,12 +263,15 @@ class TestTagView(TestCase):
     def test_next_page_url(self):
         req = self.factory.get(reverse('tag', kwargs={'name': self.tag.name}))
         resp = tag_view(req, self.tag.name)
-        self.assertContains(resp, reverse('tag', kwargs={'name': self.tag.name})+'?page=2')
+        self.assertContains(resp, reverse('tag', kwargs={'name': self.tag.name})+'?cursor=')
+        self.assertIsNotNone(_get_cursor(resp, 'Next'))
 
     def test_prev_page_url(self):
-        req = self.factory.get(reverse('tag', kwargs={'name': self.tag.name})+'?page=2')
+        url = reverse('tag', kwargs={'name': self.tag.name})
+        cursor = _get_cursor(tag_view(self.factory.get(url), self.tag.name), 'Next')
+        req = self.factory.get(url+'?cursor='+cursor)
         resp = tag_view(req, self.tag.name)
-        self.assertContains(resp, reverse('tag', kwargs={'name': self.tag.name})+'?page=1')
+        self.assertIsNotNone(_get_cursor(resp, 'Previous'))
 
 
 class TestSearchView(TestCase):
@@ -169,7 +288,8 @@ class TestSearchView(TestCase):
         resp = search_view(req)
         self.assertEqual(resp.status_code, 200)
 
-        req = self.factory.get(reverse('search')+'?q=LOL&page=2')
+        cursor = _get_cursor(search_view(req), 'Next')
+        req = self.factory.get(reverse('search')+'?q=LOL&cursor='+cursor)
         resp = search_view(req)
         self.assertEqual(resp.status_code, 200)
 
@@ -181,12 +301,23 @@ class TestSearchView(TestCase):
     def test_next_page_url(self):
         req = self.factory.get(reverse('search') + '?q=LOL')
         resp = search_view(req)
-        self.assertContains(resp, reverse('search')+'?q=LOL&amp;page=2')
+        self.assertContains(resp, reverse('search')+'?q=LOL&amp;cursor=')
+        self.assertIsNotNone(_get_cursor(resp, 'Next'))
 
     def test_prev_page_url(self):
-        req = self.factory.get(reverse('search') + '?q=LOL&page=2')
+        cursor = _get_cursor(search_view(self.factory.get(reverse('search') + '?q=LOL')), 'Next')
+        req = self.factory.get(reverse('search') + '?q=LOL&cursor=' + cursor)
+        resp = search_view(req)
+        self.assertContains(resp, reverse('search')+'?q=LOL&amp;cursor=')
+        self.assertIsNotNone(_get_cursor(resp, 'Previous'))
+
+    def test_search_result(self):
+        user = User.objects.get(username='bob')
+        Question.objects.create('Sorting', 'How to <sort> a list?', user, [])
+        req = self.factory.get(reverse('search') + '?q=sort')
         resp = search_view(req)
-        self.assertContains(resp, reverse('search')+'?q=LOL&amp;page=1')
+        self.assertContains(resp, 'class="dt"', count=1)
+        self.assertContains(resp, 'How to &lt;<mark>sort</mark>&gt; a list?')
 
     def test_search_by_tag(self):
         req = self.factory.get(reverse('search') + '?q=tag:LOL')
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+
+
+TRENDING_SIZE = 20
+TRENDING_CACHE_KEY = 'hasker:trending'
+TRENDING_CACHE_TTL = 60
+
+
+class TrendingQuestion(namedtuple('TrendingQuestion', ('id', 'title', 'slug', 'rating'))):
+    __slots__ = ()
+
+    def url(self):
+        return reverse('question', args=[self.slug])
+
+
+def get_trending():
+    trending = cache.get(TRENDING_CACHE_KEY)
+    if trending is None:
+        trending = refresh_trending()
+    return trending
+
+
+def refresh_trending():
+    from .models import Question
+    rows = Question.objects.order_by('-rating', '-creation_date')\
+        .values_list('id', 'title', 'slug', 'rating')[:TRENDING_SIZE]
+    trending = [TrendingQuestion(*row) for row in rows]
+    cache.set(TRENDING_CACHE_KEY, trending, TRENDING_CACHE_TTL)
+    return trending
+
+
+def rating_changed(question_id, rating):
+    """Drops the cached list if a question with the new rating may enter, leave or move within it"""
+    trending = cache.get(TRENDING_CACHE_KEY)
+    if trending is None:
+        return
+    if len(trending) < TRENDING_SIZE or rating >= trending[-1].rating \
+            or any(item.id == question_id for item in trending):
+        cache.delete(TRENDING_CACHE_KEY)
+        # a reader between the delete above and the commit could cache the old ranking again
+        transaction.on_commit(lambda: cache.delete(TRENDING_CACHE_KEY))
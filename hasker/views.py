@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import hashlib
+
 from django.shortcuts import render, get_object_or_404
 from django.http import (
     HttpResponseRedirect, Http404, HttpResponseBadRequest, JsonResponse, HttpResponseForbidden)
@@ -6,44 +8,60 @@ from django.urls import reverse
 from django.contrib import auth
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_GET, require_POST, require_http_methods
-from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Count, Q
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode
 
+from . import generations, search
 from .forms import AnswerForm, AskForm, LoginForm, SettingsForm, SignupForm
+from .mail import queue_mail
 from .models import Question, Tag, Answer, QuestionVote, AnswerVote
+from .page_cache import anonymous_page_cache
+from .pagination import KeysetPaginator, InvalidCursor
+
+
+QUESTION_ID_CACHE_KEY = 'hasker:question:id:{0}'
+
 
+def _list_generations(req, *args, **kwargs):
+    return [generations.QUESTIONS_KEY]
 
-QUESTIONS_LIMIT = 100
-ANSWERS_LIMIT = 150
+
+def _question_generations(req, slug):
+    key = QUESTION_ID_CACHE_KEY.format(hashlib.sha1(force_bytes(slug)).hexdigest())
+    question_id = cache.get(key)
+    if question_id is None:
+        question_id = Question.objects.filter(slug=slug).values_list('id', flat=True).first()
+        if question_id is None:
+            return []
+        cache.set(key, question_id)
+    return [generations.QUESTION_KEY.format(question_id)]
 
 
 @require_GET
+@anonymous_page_cache(_list_generations)
 def new_view(req):
-    questions = Question.objects.prefetch_related('author', 'tags').annotate(answers_num=Count('answer'))\
-        .order_by('-creation_date')[:QUESTIONS_LIMIT]
-    paginator = Paginator(questions, 20)
-    page_num = req.GET.get('page', 1)
+    questions = Question.objects.prefetch_related('author', 'tags')
+    paginator = KeysetPaginator(questions, ('creation_date', 'id'), 20)
     try:
-        page = paginator.page(page_num)
-    except (PageNotAnInteger, EmptyPage):
+        page = paginator.page(req.GET.get('cursor'))
+    except InvalidCursor:
         raise Http404()
-    context = {'questions': page, 'hot_url': reverse('hot'), 'pages_url': reverse('new')+'?page='}
+    context = {'questions': page, 'hot_url': reverse('hot'), 'pages_url': reverse('new')+'?cursor='}
     return render(req, 'new.html', context)
 
 
 @require_GET
+@anonymous_page_cache(_list_generations)
 def hot_view(req):
-    questions = Question.objects.prefetch_related('author', 'tags').annotate(answers_num=Count('answer'))\
-        .order_by('-rating', '-creation_date')[:QUESTIONS_LIMIT]
-    paginator = Paginator(questions, 20)
-    page_num = req.GET.get('page', 1)
+    questions = Question.objects.prefetch_related('author', 'tags')
+    paginator = KeysetPaginator(questions, ('hot_score', 'id'), 20)
     try:
-        page = paginator.page(page_num)
-    except (PageNotAnInteger, EmptyPage):
+        page = paginator.page(req.GET.get('cursor'))
+    except InvalidCursor:
         raise Http404()
-    context = {'questions': page, 'new_url': reverse('new'), 'pages_url': reverse('hot')+'?page='}
+    context = {'questions': page, 'new_url': reverse('new'), 'pages_url': reverse('hot')+'?cursor='}
     return render(req, 'hot.html', context)
 
 
@@ -122,6 +140,7 @@ def ask_view(req):
 
 
 @require_http_methods(['GET', 'POST'])
+@anonymous_page_cache(_question_generations)
 def question_view(req, slug):
     user = req.user
     if req.method == 'POST' and user.is_authenticated:
@@ -132,48 +151,41 @@ def question_view(req, slug):
             Answer.objects.create(question=question, text=text, author=user)
             url = u'{0}://{1}{2}'.format(
                 req.scheme, req.META['HTTP_HOST'], question.url())
-            send_mail(
+            queue_mail(
                 u'Hasker: New answer!',
                 u'Link: {0}'.format(url),
                 settings.EMAIL_HOST_USER,
                 [question.author.email],
-                html_message=u'Link: <a href="{0}">{1}</a>'.format(url, question.title),
-                fail_silently=True
+                html_message=u'Link: <a href="{0}">{1}</a>'.format(url, question.title)
             )
             return HttpResponseRedirect(question.url())
     else:
         form = AnswerForm()
+    cursor = req.GET.get('cursor')
     try:
         if user.is_authenticated:
             question = Question.objects.get(user, slug=slug)
-            answers = question.get_answers(0, ANSWERS_LIMIT, user)
+            answers = question.get_answers(cursor, user)
         else:
             question = Question.objects.get(slug=slug)
-            answers = question.get_answers(0, ANSWERS_LIMIT)
-    except Question.DoesNotExist:
-        raise Http404()
-    paginator = Paginator(answers, 30)
-    page_num = req.GET.get('page', 1)
-    try:
-        page = paginator.page(page_num)
-    except (PageNotAnInteger, EmptyPage):
+            answers = question.get_answers(cursor)
+    except (Question.DoesNotExist, InvalidCursor):
         raise Http404()
-    context = {'question': question, 'answers': page, 'form': form, 'pages_url': reverse('question', kwargs={'slug': slug})+'?page='}
+    context = {'question': question, 'answers': answers, 'form': form, 'pages_url': reverse('question', kwargs={'slug': slug})+'?cursor='}
     return render(req, 'question.html', context)
 
 
 @require_GET
+@anonymous_page_cache(_list_generations)
 def tag_view(req, name):
     tag = get_object_or_404(Tag, name=name)
-    questions = tag.question_set.all().prefetch_related('author', 'tags').annotate(answers_num=Count('answer'))\
-        .order_by('-rating', '-creation_date')[:QUESTIONS_LIMIT]
-    paginator = Paginator(questions, 20)
-    page_num = req.GET.get('page', 1)
+    questions = tag.question_set.all().prefetch_related('author', 'tags')
+    paginator = KeysetPaginator(questions, ('rating', 'creation_date', 'id'), 20)
     try:
-        page = paginator.page(page_num)
-    except (PageNotAnInteger, EmptyPage):
+        page = paginator.page(req.GET.get('cursor'))
+    except InvalidCursor:
         raise Http404()
-    context = {'questions': page, 'pages_url': reverse('tag', kwargs={'name': name})+'?page='}
+    context = {'questions': page, 'pages_url': reverse('tag', kwargs={'name': name})+'?cursor='}
     return render(req, 'tag.html', context)
 
 
@@ -185,16 +197,16 @@ def search_view(req):
     if query[:4].lower() == 'tag:':
         tag_name = query[4:].strip().lower()
         return HttpResponseRedirect(reverse('tag', kwargs={'name': tag_name}))
-    questions = Question.objects.prefetch_related('author', 'tags').annotate(answers_num=Count('answer'))\
-        .filter(Q(title__icontains=query) | Q(text__icontains=query))\
-        .order_by('-rating', '-creation_date')[:QUESTIONS_LIMIT]
-    paginator = Paginator(questions, 20)
-    page_num = req.GET.get('page', 1)
+    questions = search.search(Question.objects.prefetch_related('author', 'tags'), query)
+    paginator = KeysetPaginator(questions, ('rank', 'id'), 20)
     try:
-        page = paginator.page(page_num)
-    except (PageNotAnInteger, EmptyPage):
+        page = paginator.page(req.GET.get('cursor'))
+    except InvalidCursor:
         raise Http404()
-    context = {'query': query, 'questions': page, 'pages_url': reverse('search')+'?q={0}&page='.format(query)}
+    for question in page:
+        question.snippet = search.highlight(question.text, query)
+    pages_url = reverse('search')+'?{0}&cursor='.format(urlencode({'q': query}))
+    context = {'query': query, 'questions': page, 'pages_url': pages_url}
     return render(req, 'search.html', context)
 
 